@@ -1,7 +1,6 @@
 """Drawing a simple chart in stream mode"""
 
 import os
-import time
 import matplotlib.pyplot as plt
 from opendaq import DAQ, ExpMode, Gains
 
@@ -19,7 +18,7 @@ stream = daq.create_stream(ExpMode.ANALOG_IN, data_rate, continuous=True)
 stream.analog_setup(pinput=8, gain=Gains.S.x1)
 
 # Initiate lists and variables
-t0 = 0.0
+t0 = None
 t = []
 data = []
 
@@ -33,12 +32,14 @@ daq.start()
 
 while daq.is_measuring:
     try:
-        time.sleep(1)
-        a = stream.read()
-        l = len(a)
+        # wait for 5 new points (1 second at most)
+        ta, a = stream.read(min_points=5, timeout=1, with_time=True)
+        if not len(a):
+            continue
+        if t0 is None:
+            t0 = ta[0]
         data.extend(a)
-        t.extend([t0+(data_rate*x)/1000.0 for x in range(l)])
-        t0 += (l*data_rate)/1000.0
+        t.extend(ta - t0)
         plt.plot(t, data, color="blue", linewidth=2.5, linestyle="-")
         plt.draw()
     except KeyboardInterrupt:
@@ -24,7 +24,7 @@ stream2 = daq.create_stream(ExpMode.ANALOG_OUT, period=500,
 stream2.load_signal(preload_buffer)
 
 # Initiate lists and variables
-t0 = 0.0
+t0 = None
 t = []
 data = []
 
@@ -39,13 +39,15 @@ daq.start()
 while daq.is_measuring:
     try:
         time.sleep(1)
-        a = stream1.read()
-        l = len(a)
+        ta, a = stream1.read(with_time=True)
+        if not len(a):
+            continue
+        if t0 is None:
+            t0 = ta[0]  # time reference
         # append values list with new points from the stream
         data.extend(a)
-        # append time list with the same number of elements
-        t.extend([t0+(data_rate*x)/1000.0 for x in range(l)])
-        t0 += (l*data_rate)/1000.0  # increase the time reference
+        # append time list with the timestamps of the points
+        t.extend(ta - t0)
         plt.plot(t, data, color="blue", linewidth=1.0, linestyle="-")
         plt.draw()
     except KeyboardInterrupt:
@@ -28,7 +28,7 @@ print("Waiting for trigger...")
 while daq.is_measuring:
     time.sleep(1)
     data1 = stream1.read()
-    if data1:
+    if len(data1):
         print("data1", data1)
 
 daq.stop()
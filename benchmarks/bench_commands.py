@@ -0,0 +1,25 @@
+"""Micro-benchmark of the command-response path: building, sending and
+parsing commands against the simulator"""
+
+from __future__ import print_function
+import timeit
+from opendaq import DAQ
+from opendaq.common import mkcmd, parse_command
+
+daq = DAQ('sim')
+packet = mkcmd(2, 'hBBBB', 1000, 1, 0, 1, 20)
+
+tests = [
+    ('mkcmd', lambda: mkcmd(2, 'BBBB', 1, 0, 1, 20)),
+    ('parse_command', lambda: parse_command(packet, '!BBhBBBB', 10)),
+    ('read_adc', daq.read_adc),
+    ('read_pio', lambda: daq.read_pio(1)),
+    ('set_pio', lambda: daq.set_pio(1, 1)),
+]
+
+print("%16s %12s %14s" % ('operation', 'time (us)', 'calls/s'))
+
+for name, func in tests:
+    n = 20000
+    t = timeit.timeit(func, number=n)/n
+    print("%16s %12.2f %14.0f" % (name, t*1e6, 1/t))
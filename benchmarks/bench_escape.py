@@ -0,0 +1,48 @@
+"""Micro-benchmark of the stream unescaping routine (common.escape_bytes)
+against the original byte-by-byte implementation"""
+
+from __future__ import print_function
+import timeit
+import numpy as np
+from opendaq.common import escape_bytes, stuff_bytes
+
+
+def escape_bytes_loop(data, escape_codes):
+    """Original pure-Python implementation."""
+    newdata = bytearray()
+    escape = False
+
+    for b in data:
+        if b in escape_codes:
+            escape = True
+        elif escape:
+            newdata.append(b ^ 0x20)
+            escape = False
+        else:
+            newdata.append(b)
+
+    return newdata
+
+
+rng = np.random.RandomState(0)
+codes = (0x7d, 0x7e)
+
+print("%10s %10s %12s %12s %8s" % ('size', 'escapes', 'loop (us)',
+                                   'bulk (us)', 'speedup'))
+
+for size in (20, 250, 4096, 65536):
+    for escapes in (False, True):
+        if escapes:
+            data = stuff_bytes(rng.randint(0, 256, size).astype(np.uint8))
+        else:
+            data = bytearray(rng.randint(0, 0x7d, size).astype(np.uint8))
+
+        assert escape_bytes(data, codes) == escape_bytes_loop(data, codes)
+
+        n = max(10, 200000 // size)
+        t_loop = timeit.timeit(lambda: escape_bytes_loop(data, codes),
+                               number=n)/n*1e6
+        t_bulk = timeit.timeit(lambda: escape_bytes(data, codes),
+                               number=n)/n*1e6
+        print("%10d %10s %12.2f %12.2f %7.1fx" % (size, escapes, t_loop,
+                                                  t_bulk, t_loop/t_bulk))
@@ -22,10 +22,12 @@ from __future__ import absolute_import
 
 try:
     from .daq import DAQ, LedColor, ExpMode, Trigger
+    from .experiment import Overflow
     from .models import Gains
     from .daq_model import CalibReg
 except ImportError:
     pass
 
 __version__ = '0.3.2'
-__all__ = ['DAQ', 'LedColor', 'ExpMode', 'Trigger', 'Gains', 'CalibReg']
+__all__ = ['DAQ', 'LedColor', 'ExpMode', 'Trigger', 'Overflow', 'Gains',
+           'CalibReg']
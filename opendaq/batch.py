@@ -0,0 +1,101 @@
+#!/usr/bin/env python
+
+# Copyright 2016
+# Ingen10 Ingenieria SL
+#
+# This file is part of opendaq.
+#
+# opendaq is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Lesser General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# opendaq is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Lesser General Public License for more details.
+#
+# You should have received a copy of the GNU Lesser General Public License
+# along with opendaq.  If not, see <http://www.gnu.org/licenses/>.
+
+from .common import get_struct, parse_command
+
+
+class CommandBatch(object):
+    """List of commands sent to the device at once (see :meth:`DAQ.batch`).
+
+    After the batch is sent, `results` holds, for each command, the
+    arguments of its response, None if it has no response, or the exception
+    raised while parsing it.
+    """
+    def __init__(self):
+        self.commands = []
+        self.results = []
+
+    def __len__(self):
+        return len(self.commands)
+
+    def send_command(self, command, ret_fmt=None):
+        """Queue a command.
+
+        :param command: Command string.
+        :param ret_fmt: Payload format of the response (None: no response).
+        :returns: Index of the command in the batch.
+        """
+        self.commands.append((bytes(command), ret_fmt))
+        return len(self.commands) - 1
+
+    @property
+    def errors(self):
+        """List of the exceptions raised by the commands."""
+        return [r for r in self.results if isinstance(r, Exception)]
+
+    def result(self, index):
+        """Response of a command.
+
+        :param index: Index of the command in the batch.
+        :returns: Arguments of the response.
+        :raises: The error of the command, if it failed.
+        """
+        ret = self.results[index]
+        if isinstance(ret, Exception):
+            raise ret
+        return ret
+
+    def packet(self):
+        """All the commands joined into a single packet."""
+        return b''.join(command for command, _ in self.commands)
+
+    def response_lengths(self):
+        """Expected length of the responses (commands without response
+        excluded)."""
+        return [2 + get_struct('!BB' + fmt).size
+                for _, fmt in self.commands if fmt is not None]
+
+    def response_commands(self):
+        """Command number of the responses (commands without response
+        excluded)."""
+        return [bytearray(command)[2]
+                for command, fmt in self.commands if fmt is not None]
+
+    def parse(self, responses):
+        """Parse the responses of the commands.
+
+        :param responses: List of the received responses, in order
+            (commands without response excluded).
+        """
+        responses = iter(responses)
+        self.results = []
+
+        for _, ret_fmt in self.commands:
+            if ret_fmt is None:
+                self.results.append(None)
+                continue
+
+            fmt = '!BB' + ret_fmt
+            ret_len = 2 + get_struct(fmt).size
+            try:
+                ret = bytearray(next(responses, b''))
+                self.results.append(parse_command(ret, fmt, ret_len))
+            except (IOError, ValueError) as e:
+                self.results.append(e)
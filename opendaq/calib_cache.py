@@ -0,0 +1,97 @@
+#!/usr/bin/env python
+
+# Copyright 2016
+# Ingen10 Ingenieria SL
+#
+# This file is part of opendaq.
+#
+# opendaq is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Lesser General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# opendaq is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Lesser General Public License for more details.
+#
+# You should have received a copy of the GNU Lesser General Public License
+# along with opendaq.  If not, see <http://www.gnu.org/licenses/>.
+
+"""On-disk cache of the calibration of openDAQ devices.
+
+The cache is a JSON file with an entry per device, keyed by model, firmware
+version and serial number, so that a firmware update or a new serial number
+never reuses stale values.
+"""
+
+import os
+import json
+from .daq_model import CalibReg
+
+
+class CalibCache(object):
+    """Calibration cache stored in a JSON file.
+
+    :param path: Path of the cache file (created when first written).
+    """
+    def __init__(self, path):
+        self.path = path
+
+    @staticmethod
+    def key(model_id, fw_ver, serial):
+        """Cache key of a device (see :meth:`DAQ.get_info`)."""
+        return '%d-%d-%d' % (model_id, fw_ver, serial)
+
+    def __load(self):
+        try:
+            with open(self.path) as f:
+                return json.load(f)
+        except (IOError, OSError, ValueError):
+            # missing or corrupted file: start from scratch
+            return {}
+
+    def get(self, key):
+        """Calibration of a device.
+
+        :param key: Cache key of the device.
+        :returns: (dac_calib, adc_calib) lists of CalibReg, or None if the
+            device is not in the cache.
+        """
+        entry = self.__load().get(key)
+        if entry is None:
+            return None
+        try:
+            return ([CalibReg(*reg) for reg in entry['dac']],
+                    [CalibReg(*reg) for reg in entry['adc']])
+        except (KeyError, TypeError):
+            return None
+
+    def __save(self, entries):
+        # the file is replaced atomically, so a crash never leaves it
+        # half-written
+        tmp = '%s.%d.tmp' % (self.path, os.getpid())
+        with open(tmp, 'w') as f:
+            json.dump(entries, f, indent=1, sort_keys=True)
+        try:
+            os.replace(tmp, self.path)
+        except AttributeError:  # Python 2
+            os.rename(tmp, self.path)
+
+    def put(self, key, dac_calib, adc_calib):
+        """Store the calibration of a device.
+
+        :param key: Cache key of the device.
+        :param dac_calib: List of DAC calibration registers.
+        :param adc_calib: List of ADC calibration registers.
+        """
+        entries = self.__load()
+        entries[key] = dict(dac=[list(reg) for reg in dac_calib],
+                            adc=[list(reg) for reg in adc_calib])
+        self.__save(entries)
+
+    def remove(self, key):
+        """Forget the calibration of a device."""
+        entries = self.__load()
+        if entries.pop(key, None) is not None:
+            self.__save(entries)
@@ -0,0 +1,197 @@
+#!/usr/bin/env python
+
+# Copyright 2016
+# Ingen10 Ingenieria SL
+#
+# This file is part of opendaq.
+#
+# opendaq is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Lesser General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# opendaq is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Lesser General Public License for more details.
+#
+# You should have received a copy of the GNU Lesser General Public License
+# along with opendaq.  If not, see <http://www.gnu.org/licenses/>.
+
+"""Capture files of the raw bytes received from an openDAQ.
+
+A capture file starts with a magic string followed by one record per chunk
+of received bytes: host timestamp (seconds since the start of the capture,
+float64), length (uint32) and the bytes themselves.
+"""
+
+import time
+import struct
+from .common import monotonic
+from .simulator import DAQSimulator
+
+MAGIC = b'ODAQCAP1'
+RECORD = struct.Struct('<dI')
+
+# commands that start the replay of a capture (see DAQ.start)
+REPLAY_CMDS = (19, 20, 21)     # STREAM_CREATE, EXTERNAL_CREATE, BURST_CREATE
+STREAM_STOP = 80
+
+
+class CaptureWriter(object):
+    """Write raw data chunks into a capture file.
+
+    :param path: Path of the capture file (it is overwritten).
+    """
+    def __init__(self, path):
+        self.path = path
+        self.__file = open(path, 'wb')
+        self.__file.write(MAGIC)
+        self.__t0 = monotonic()
+
+    @property
+    def closed(self):
+        return self.__file is None
+
+    def write(self, data):
+        """Append a chunk of bytes to the capture."""
+        if not data or self.__file is None:
+            return
+        self.__file.write(RECORD.pack(monotonic() - self.__t0, len(data)))
+        self.__file.write(bytes(data))
+
+    def close(self):
+        if self.__file is not None:
+            self.__file.close()
+            self.__file = None
+
+
+def read_capture(path):
+    """Generator that reads the chunks of a capture file.
+
+    :param path: Path of the capture file.
+    :returns: (timestamp, data) tuples.
+    :raises: IOError: Invalid or truncated capture file.
+    """
+    with open(path, 'rb') as f:
+        if f.read(len(MAGIC)) != MAGIC:
+            raise IOError("Invalid capture file")
+
+        while True:
+            header = f.read(RECORD.size)
+            if not header:
+                break
+            if len(header) < RECORD.size:
+                raise IOError("Truncated capture file")
+
+            timestamp, length = RECORD.unpack(header)
+            data = f.read(length)
+            if len(data) < length:
+                raise IOError("Truncated capture file")
+            yield timestamp, data
+
+
+class ReplaySerial(DAQSimulator):
+    """Serial port that plays back a capture file.
+
+    It behaves as the simulator until the first experiment is created. From
+    then on, the written commands are ignored and the captured bytes are
+    returned by read(), either at the recorded pace or as fast as possible.
+    Once the capture is exhausted, the simulator takes over again with the
+    next command.
+
+    :param path: Path of the capture file.
+    :param realtime: Replay the data at the recorded speed.
+    """
+    def __init__(self, path, realtime=True, port=None, baudrate=9600,
+                 timeout=None):
+        DAQSimulator.__init__(self, port, baudrate, timeout)
+        self.path = path
+        self.realtime = realtime
+        self.__chunks = None
+        self.__next = None
+        self.__t0 = None
+        self.__buf = bytearray()
+
+    @property
+    def replaying(self):
+        """True while the capture is being played back."""
+        return self.__chunks is not None
+
+    def __start_replay(self):
+        self.__chunks = read_capture(self.path)
+        self.__next = next(self.__chunks, None)
+        self.__t0 = monotonic()
+        del self.__buf[:]
+
+    def __release(self):
+        """Move the due chunks of the capture into the input buffer."""
+        now = monotonic() - self.__t0
+        while self.__next is not None and (
+                not self.realtime or self.__next[0] <= now):
+            self.__buf.extend(self.__next[1])
+            self.__next = next(self.__chunks, None)
+
+    def write(self, data):
+        if not self.port_open:
+            raise IOError("Port is closed")
+
+        ncmd = bytearray(data)[2] if len(data) > 2 else None
+        if ncmd == STREAM_STOP:
+            # the device does not answer this command
+            return len(data)
+
+        if self.replaying and self.__next is None and not self.__buf:
+            # capture exhausted: go back to the simulator
+            self.__chunks = None
+
+        if not self.replaying and ncmd in REPLAY_CMDS:
+            self.__start_replay()
+
+        if self.replaying:
+            return len(data)
+        return DAQSimulator.write(self, data)
+
+    def read(self, size=1):
+        if not self.replaying:
+            return DAQSimulator.read(self, size)
+        if not self.port_open:
+            raise IOError("Port is closed")
+
+        deadline = None if self.timeout is None else (
+            monotonic() + self.timeout)
+        self.__release()
+        while len(self.__buf) < size and self.__next is not None:
+            wait = self.__t0 + self.__next[0] - monotonic()
+            if deadline is not None:
+                remaining = deadline - monotonic()
+                if remaining <= 0:
+                    break
+                wait = min(wait, remaining)
+            if wait > 0:
+                time.sleep(wait)
+            self.__release()
+
+        if not self.__buf and self.__next is None and self.timeout:
+            # end of the capture: emulate a read timeout
+            time.sleep(self.timeout)
+
+        ret = bytes(self.__buf[:size])
+        del self.__buf[:size]
+        return ret
+
+    @property
+    def in_waiting(self):
+        if not self.replaying:
+            return DAQSimulator.in_waiting.fget(self)
+        self.__release()
+        return len(self.__buf)
+
+    def flushInput(self):
+        if self.replaying:
+            del self.__buf[:]
+        DAQSimulator.flushInput(self)
+
+    def close(self):
+        self.__chunks = None
+        DAQSimulator.close(self)
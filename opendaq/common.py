@@ -20,6 +20,33 @@
 
 import struct
 import array
+import numpy as np
+
+try:
+    from time import monotonic
+except ImportError:  # Python 2
+    from time import time as monotonic
+
+
+# escape count from which numpy is faster than splitting the data
+MAX_SPLIT_ESCAPES = 32
+
+CRC = struct.Struct('!H')
+_structs = {}
+
+
+def get_struct(fmt):
+    """Compiled struct for a format string. Every format is compiled only
+    once and cached.
+
+    :param fmt: Format string (in 'struct' notation).
+    :returns: struct.Struct object.
+    """
+    try:
+        return _structs[fmt]
+    except KeyError:
+        st = _structs[fmt] = struct.Struct(fmt)
+        return st
 
 
 class CRCError(ValueError):
@@ -36,7 +63,7 @@ def crc(data):
     :param data: Bynary data.
     """
     s = sum(bytearray(data)) % 65536
-    return struct.pack('!H', s)
+    return CRC.pack(s)
 
 
 def check_crc(data):
@@ -58,9 +85,10 @@ def check_stream_crc(head, data):
 
     :param head: Header data of a packet.
     :param data: Payload of a packet.
+    :returns: True if the checksum is correct.
     """
     csum = (head[0] << 8) + head[1]
-    return csum == sum(head[2:] + data)
+    return csum == (sum(head[2:]) + sum(data)) % 65536
 
 
 def mkcmd(ncmd, fmt, *args):
@@ -70,9 +98,8 @@ def mkcmd(ncmd, fmt, *args):
     :param fmt: Format string, excluding header (in 'struct' notation).
     :param args: Command arguments.
     """
-    fmt = '!BB' + fmt
-    cmdlen = struct.calcsize(fmt) - 2
-    cmd = struct.pack(fmt, ncmd, cmdlen, *args)
+    st = get_struct('!BB' + fmt)
+    cmd = st.pack(ncmd, st.size - 2, *args)
     return bytearray(crc(cmd) + cmd)
 
 
@@ -84,6 +111,7 @@ def bytes2hex(data):
 
 NAK = mkcmd(160, '')
 
+
 def parse_command(data, fmt, length):
     if data == NAK:
         raise IOError("NAK response received")
@@ -92,7 +120,7 @@ def parse_command(data, fmt, length):
         raise LengthError("Bad packet length %d (it should be %d)" %
                           (len(data), length))
 
-    data = struct.unpack(fmt, check_crc(data))
+    data = get_struct(fmt).unpack(check_crc(data))
     if data[1] != length - 4:
         raise LengthError("Bad body length %d (it should be %d)" %
                           (length - 4, data[1]))
@@ -100,17 +128,71 @@ def parse_command(data, fmt, length):
     return data[2:]
 
 
-def escape_bytes(data, escape_codes):
+def stuff_bytes(data, escape_codes=(0x7d, 0x7e)):
+    """Escape the bytes of a stream packet (inverse of :func:`escape_bytes`).
+
+    Every byte found in `escape_codes` is replaced by the escape byte 0x7d
+    followed by the original byte XORed with 0x20.
+    """
     newdata = bytearray()
-    escape = False
 
-    for b in data:
+    for b in bytearray(data):
         if b in escape_codes:
-            escape = True
-        elif escape:
+            newdata.append(0x7d)
             newdata.append(b ^ 0x20)
-            escape = False
         else:
             newdata.append(b)
 
     return newdata
+
+
+def mkstream(ncmd, fmt, *args):
+    """Make an escaped stream packet, including its start byte (0x7e).
+
+    :param ncmd: Command number.
+    :param fmt: Format string, excluding header (in 'struct' notation).
+    :param args: Packet arguments.
+    """
+    return bytearray([0x7e]) + stuff_bytes(mkcmd(ncmd, fmt, *args))
+
+
+def escape_bytes(data, escape_codes):
+    """Remove the escape bytes of a stream packet.
+
+    Every byte found in `escape_codes` is dropped, and the byte following it
+    is XORed with 0x20. The buffer is processed in bulk: it is split on the
+    escape bytes, or unescaped with numpy masks when escapes are frequent.
+
+    :param data: Escaped binary data.
+    :param escape_codes: Values of the escape bytes.
+    :returns: Unescaped data (bytearray).
+    """
+    sep = struct.pack('B', escape_codes[0])
+    data = bytes(data)
+    for c in escape_codes[1:]:
+        code = struct.pack('B', c)
+        if data.find(code) >= 0:
+            data = data.replace(code, sep)
+
+    if data.find(sep) < 0:
+        return bytearray(data)
+
+    parts = data.split(sep, MAX_SPLIT_ESCAPES)
+    if len(parts) > MAX_SPLIT_ESCAPES:
+        raw = np.frombuffer(data, dtype=np.uint8)
+        escaped = np.zeros(len(raw) + 1, dtype=bool)
+        escaped[1:] = raw == escape_codes[0]
+
+        # a byte is flipped when the preceding one is an escape byte
+        keep = ~escaped[1:]
+        newdata = raw[keep]
+        newdata[escaped[:-1][keep]] ^= 0x20
+        return bytearray(newdata.tobytes())
+
+    newdata = bytearray(parts[0])
+    for part in parts[1:]:
+        if part:
+            newdata.append(bytearray(part[:1])[0] ^ 0x20)
+            newdata += part[1:]
+
+    return newdata
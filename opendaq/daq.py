@@ -24,16 +24,28 @@ import time
 import struct
 import array
 import serial
-from threading import Thread
+import numpy as np
+from threading import Thread, RLock, current_thread
+from contextlib import contextmanager
 from enum import IntEnum
-from .common import check_stream_crc, mkcmd, parse_command, bytes2hex, escape_bytes
+from .common import check_stream_crc, mkcmd, parse_command, bytes2hex
+from .common import get_struct, monotonic, NAK
 from .common import LengthError, CRCError
 from .experiment import Trigger, ExpMode, DAQStream, DAQBurst, DAQExternal
 from .simulator import DAQSimulator
+from .capture import CaptureWriter, ReplaySerial
+from .batch import CommandBatch
+from .metrics import ProtocolMetrics
+from .calib_cache import CalibCache
+from .stream import StreamDecoder, PendingResponses
 from .models import DAQModel
 
 BAUDS = 115200
+SETTLE_TIMEOUT = 2.     # maximum time for the device to boot (seconds)
+SETTLE_POLL = 0.1
+CALIB_RETRIES = 3       # attempts to write a calibration slot
 MAX_CHANNELS = 4
+STREAM_HEADER = struct.Struct('!HBBB')   # checksum, command, length, channel
 
 
 class CMD(IntEnum):
@@ -86,6 +98,14 @@ class CMD(IntEnum):
     STREAM_STOP = 80
 
 
+def _cmd_name(cmd):
+    """CMD member of a command number (the number if it is unknown)."""
+    try:
+        return CMD(cmd)
+    except ValueError:
+        return cmd
+
+
 class LedColor(IntEnum):
     """Valid LED colors."""
     OFF = 0
@@ -97,10 +117,16 @@ class LedColor(IntEnum):
 class DAQ(object):
     """This class represents an OpenDAQ device."""
 
-    def __init__(self, port, debug=False):
+    def __init__(self, port, debug=False, calib_cache=None):
         """Class constructor
-        :param port: Serial port.
+        :param port: Serial port. Use 'sim' for the simulator,
+            'replay:<path>' to play back a capture file at the recorded speed
+            or 'replay-fast:<path>' to play it back as fast as possible.
         :param debug: Turn on serial echoing to sdout.
+        :param calib_cache: Path of a calibration cache file. If given, the
+            calibration is read from the device only the first time that it
+            is connected, and then taken from the cache (see
+            :class:`.CalibCache`).
         """
         self.__port = port
         self.__debug = debug
@@ -112,56 +138,275 @@ class DAQ(object):
         self.__ninput = 0
         self.__exp = []     # list of experiments
         self.__thread = None
+        self.__capture = None
+        self.__stopping = False
+        self.__batch = None
+        self.__batch_owner = None
+        self.__cmd_lock = RLock()
+        self.__reading = False  # the reader thread owns the port
+        self.__metrics = ProtocolMetrics()
+        self.__decoder = StreamDecoder(
+            commands=(CMD.STREAM_DATA, CMD.STREAM_STOP))
 
         self.open()
 
-        self.__model = DAQModel.new(*self.get_info())
+        info = self.get_info()
+        self.__model = DAQModel.new(*info)
         self.hw_ver = self.__model.model_str
         self.fw_ver = self.__model.fw_ver
-        self.__model.load_dac_calib(self.__read_calib_slot)
-        self.__model.load_adc_calib(self.__read_calib_slot)
+
+        self.__calib_cache = None
+        if calib_cache is not None:
+            self.__calib_cache = CalibCache(calib_cache)
+            self.__calib_key = CalibCache.key(*info)
+        self.__load_calib()
         self.clear_experiments()
 
+    def __load_calib(self):
+        """Load the calibration from the cache, or from the device if it is
+        not cached."""
+        cache = self.__calib_cache
+        calib = cache and cache.get(self.__calib_key)
+        if calib and len(calib[0]) == len(self.__model.dac_calib) and \
+                len(calib[1]) == len(self.__model.adc_calib):
+            self.__model.dac_calib, self.__model.adc_calib = calib
+            return
+
+        self.__model.load_dac_calib(self.__read_calib_slots)
+        self.__model.load_adc_calib(self.__read_calib_slots)
+        self.__store_calib()
+
+    def __store_calib(self):
+        if self.__calib_cache is not None:
+            self.__calib_cache.put(self.__calib_key, self.__model.dac_calib,
+                                   self.__model.adc_calib)
+
+    def __forget_calib(self):
+        if self.__calib_cache is not None:
+            self.__calib_cache.remove(self.__calib_key)
+
     def open(self):
         """Open the serial port."""
         if self.__port == 'sim':
             self.ser = DAQSimulator(self.__port, BAUDS, timeout=1)
+        elif self.__port.startswith(('replay:', 'replay-fast:')):
+            mode, path = self.__port.split(':', 1)
+            self.ser = ReplaySerial(path, mode == 'replay', self.__port,
+                                    BAUDS, timeout=1)
         elif 'simavr' in self.__port:
             self.ser = serial.Serial(self.__port, BAUDS, timeout=10,
                                      rtscts=True, dsrdtr=True)
         else:
             self.ser = serial.Serial(self.__port, BAUDS, timeout=1)
-            self.ser.setRTS(0)
-            time.sleep(2)
+            try:
+                self.ser.setRTS(0)
+            except IOError:
+                # pseudo-terminals (e.g. opendaq-sim) have no modem lines
+                pass
+            self.__wait_ready()
+
+    def __wait_ready(self):
+        """Wait until the device answers after opening the port (it may
+        reboot), polling it with ID_CONFIG commands instead of sleeping a
+        fixed time. If it never answers, the next command will fail."""
+        probe = mkcmd(CMD.ID_CONFIG, '')
+        fmt = '!BBBBI'
+        size = 2 + get_struct(fmt).size
+        port_timeout = self.ser.timeout
+        self.ser.timeout = SETTLE_POLL
+        deadline = monotonic() + SETTLE_TIMEOUT
+
+        try:
+            while monotonic() < deadline:
+                self.ser.write(probe)
+                try:
+                    parse_command(bytearray(self.ser.read(size)), fmt, size)
+                except (IOError, ValueError):
+                    self.ser.flushInput()
+                    continue
+
+                # drop the late responses to the previous probes
+                time.sleep(SETTLE_POLL)
+                self.ser.flushInput()
+                return
+        finally:
+            self.ser.timeout = port_timeout
 
     def close(self):
         """Close the serial port."""
+        self.__close_capture()
         self.ser.close()
 
     def send_command(self, command, ret_fmt=None):
         """Build a command packet, send it to the openDAQ and process the
         response.
 
+        It is thread-safe, and it can be used while the experiments are
+        running: the reader thread then routes the response to the caller.
+
         :param command: Command string.
         :param ret_fmt: Payload format of the response using python 'struct'
             format characters. I ret_fmt is None, no response is expected.
-        :returns: Command ID and arguments of the response.
+        :returns: Command ID and arguments of the response (None inside a
+            batch, where the command is only queued).
         :raises: LengthError: The legth of the response is not the expected.
         """
-        self.ser.write(command)
-        if self.__debug:
-            print("SENT:", bytes2hex(command))
+        if self.__batch is not None and \
+                self.__batch_owner is current_thread():
+            self.__batch.send_command(command, ret_fmt)
+            return
 
+        cmd = bytearray(command)[2]
+        t0 = monotonic()
         if ret_fmt is None:
+            self.__exchange(command, [], [])
+            self.__metrics.record(cmd, monotonic() - t0, len(command), b'')
             return
 
         fmt = '!BB' + ret_fmt
-        ret_len = 2 + struct.calcsize(fmt)
-        ret = bytearray(self.ser.read(ret_len))
-        if self.__debug:
-            print("RECV:", bytes2hex(ret))
+        ret_len = 2 + get_struct(fmt).size
+        data = self.__exchange(command, [ret_len], [cmd])[0]
+        latency = monotonic() - t0
+        try:
+            ret = parse_command(data, fmt, ret_len)
+        except (IOError, ValueError) as e:
+            self.__metrics.record(cmd, latency, len(command), data, e)
+            raise
+        self.__metrics.record(cmd, latency, len(command), data)
+        return ret
+
+    def __exchange(self, packet, lengths, commands):
+        """Send a packet with one or more commands and receive their
+        responses.
+
+        :param packet: Bytes to send.
+        :param lengths: Expected length of each response.
+        :param commands: Command number of each response.
+        :returns: List of responses (incomplete if the port timed out).
+        """
+        with self.__cmd_lock:
+            if self.__reading and lengths:
+                # the reader thread routes the responses to us
+                pending = PendingResponses(lengths, commands)
+                self.__decoder.pending = pending
+                self.ser.write(packet)
+                if self.__debug:
+                    print("SENT:", bytes2hex(bytearray(packet)))
+
+                timeout = self.ser.timeout
+                if timeout is not None:
+                    timeout *= max(len(lengths), 1)
+                pending.wait(timeout)
+                self.__decoder.pending = None
+                responses = pending.responses
+                responses += [b''] * (len(lengths) - len(responses))
+            else:
+                self.ser.write(packet)
+                if self.__debug:
+                    print("SENT:", bytes2hex(bytearray(packet)))
+                responses = []
+                for length in lengths:
+                    response = self.__read_response(length)
+                    responses.append(response)
+                    if len(response) < len(NAK):
+                        # timed out: do not wait for the next ones
+                        break
+                responses += [b''] * (len(lengths) - len(responses))
+
+        if self.__debug and lengths:
+            print("RECV:", bytes2hex(bytearray(b''.join(
+                bytes(r) for r in responses))))
+        return [bytearray(r) for r in responses]
+
+    def __read_response(self, length):
+        """Read a response of the given length, or a NAK packet, which is
+        shorter, without waiting for the rest of the expected bytes."""
+        data = self.__read(min(length, len(NAK)))
+        if len(data) < length and bytearray(data) != NAK:
+            data += self.__read(length - len(data))
+        return data
+
+    @contextmanager
+    def batch(self):
+        """Context manager that pipelines commands.
+
+        The commands sent inside the block (by the calling thread) are
+        queued and written at once when it ends. Then all the responses are
+        read and validated in a single pass, saving a round trip per
+        command. Inside the block, commands return None, so only the
+        methods that do not use the response can be called. Use the
+        send_command method of the batch to get the responses afterwards::
+
+            with daq.batch() as b:
+                daq.set_led(LedColor.RED)
+                index = b.send_command(mkcmd(CMD.PIO, 'B', 1), 'BB')
+            npio, value = b.result(index)
+
+        :returns: :class:`.CommandBatch` that stores the responses.
+        :raises: The first error found in the responses (the rest of the
+            results are still available in the batch).
+        """
+        with self.__cmd_lock:
+            if self.__batch is not None:
+                raise IOError("Nested command batches are not allowed")
+
+            batch = self.__batch = CommandBatch()
+            self.__batch_owner = current_thread()
+            try:
+                yield batch
+            finally:
+                self.__batch = None
+                self.__batch_owner = None
+
+            if len(batch):
+                t0 = monotonic()
+                responses = self.__exchange(batch.packet(),
+                                            batch.response_lengths(),
+                                            batch.response_commands())
+                latency = monotonic() - t0
+                batch.parse(responses)
+                self.__record_batch(batch, responses, latency)
+                if batch.errors:
+                    raise batch.errors[0]
+
+    def __record_batch(self, batch, responses, latency):
+        """Record the metrics of the commands of a batch, which share the
+        same round trip."""
+        self.__metrics.record_batch()
+        responses = iter(responses)
+        for (command, ret_fmt), ret in zip(batch.commands, batch.results):
+            data = b'' if ret_fmt is None else next(responses, b'')
+            error = ret if isinstance(ret, Exception) else None
+            self.__metrics.record(bytearray(command)[2], latency,
+                                  len(command), data, error)
+
+    def metrics(self):
+        """Protocol metrics since the port was opened or the last call to
+        reset_metrics().
+
+        The commands in a batch share its round-trip time.
+
+        :returns: Dictionary with the totals of calls, bytes_out, bytes_in,
+            naks, length_errors, crc_errors, timeouts and other_errors, the
+            number of batches and of stream_bytes received, the latency_bins
+            (upper bounds in seconds) and, under 'commands', the same
+            counters for each CMD, plus their latency histogram and min, max
+            and mean latencies.
+        """
+        return self.__metrics.to_dict(names=_cmd_name)
+
+    def reset_metrics(self):
+        """Clear the protocol metrics."""
+        self.__metrics.reset()
 
-        return parse_command(ret, fmt, ret_len)
+    def __read(self, size):
+        """Read bytes from the serial port, copying them into the capture
+        file if there is one open."""
+        data = self.ser.read(size)
+        capture = self.__capture
+        if capture is not None:
+            capture.write(data)
+        return data
 
     def enable_crc(self, on):
         """Enable/Disable the cyclic redundancy check.
@@ -171,31 +416,41 @@ class DAQ(object):
         return self.send_command(mkcmd(CMD.ENABLE_CRC, 'B',
                                        int(bool(on))), 'B')[0]
 
-    def __read_calib_slot(self, slot):
-        """Read a calibration slot.
+    def __read_calib_slots(self, slots):
+        """Read calibration slots (all the commands in a single batch).
 
-        :param slot_id: Number of the calibration slot.
-        :returns:
-            - Gain raw correction
-            - Offset raw correction
+        :param slots: List of slot numbers.
+        :returns: List of (gain, offset) raw corrections.
         :raises: ValueError
         """
-        return self.send_command(mkcmd(CMD.GET_CALIB, 'B', slot), 'Bhh')[1:]
+        with self.batch() as b:
+            indexes = [b.send_command(mkcmd(CMD.GET_CALIB, 'B', slot), 'Bhh')
+                       for slot in slots]
+        return [b.result(i)[1:] for i in indexes]
+
+    def __write_calib_slots(self, slots):
+        """Write calibration slots (all the commands in a single batch), and
+        verify them reading them back. The slots that do not match are
+        written again.
+
+        :param slots: List of (slot number, gain, offset), with the raw
+            corrections (signed 16-bit integers).
+        :raises: ValueError, IOError: The slots could not be written.
+        """
+        for attempt in range(CALIB_RETRIES):
+            with self.batch():
+                for slot, gain, offset in slots:
+                    self.send_command(mkcmd(CMD.SET_CALIB, 'Bhh', slot, gain,
+                                            offset), 'Bhh')
 
-    def __write_calib_slot(self, slot_id, gain, offset):
-        """Write a calibration slot.
+            values = self.__read_calib_slots([slot[0] for slot in slots])
+            slots = [slot for slot, value in zip(slots, values)
+                     if tuple(value) != slot[1:]]
+            if not slots:
+                return
 
-        :param slot_id: Number of the calibration slot.
-        :param gain: Gain raw correction (signed 16-bit integer).
-        :param offset: Offset raw correction (signed 16-bit integer).
-        :returns:
-            - Slot number
-            - Gain raw correction
-            - Offset raw correction
-        :raises: ValueError
-        """
-        return self.send_command(mkcmd(CMD.SET_CALIB, 'Bhh', slot_id,
-                                       int(gain), int(offset)), 'Bhh')
+        raise IOError("Calibration slots %s could not be written" %
+                      [slot[0] for slot in slots])
 
     def get_dac_calib(self):
         """Get the DAC calibration.
@@ -212,20 +467,40 @@ class DAQ(object):
         return list(self.__model.adc_calib)  # return a copy of the list
 
     def set_dac_calib(self, regs):
-        """Set the DAC calibration.
+        """Set the DAC calibration. Only the slots that change are written,
+        and they are verified reading them back.
 
         :param regs: A list of CalibReg objects.
-        :raises: ValueError, IndexError
+        :returns: Numbers of the written slots.
+        :raises: ValueError, IndexError, IOError
         """
-        self.__model.write_dac_calib(regs, self.__write_calib_slot)
+        try:
+            slots = self.__model.write_dac_calib(regs,
+                                                 self.__write_calib_slots)
+        except (IOError, ValueError):
+            # the device may have been partially written
+            self.__forget_calib()
+            raise
+        self.__store_calib()
+        return slots
 
     def set_adc_calib(self, regs):
-        """Set the ADC calibration.
+        """Set the ADC calibration. Only the slots that change are written,
+        and they are verified reading them back.
 
         :param regs: A list of CalibReg objects.
-        :raises: ValueError, IndexError
+        :returns: Numbers of the written slots.
+        :raises: ValueError, IndexError, IOError
         """
-        self.__model.write_adc_calib(regs, self.__write_calib_slot)
+        try:
+            slots = self.__model.write_adc_calib(regs,
+                                                 self.__write_calib_slots)
+        except (IOError, ValueError):
+            # the device may have been partially written
+            self.__forget_calib()
+            raise
+        self.__store_calib()
+        return slots
 
     def set_id(self, id):
         """Identify openDAQ device.
@@ -286,7 +561,7 @@ class DAQ(object):
         "param raw: Raw ADC value.
         :raises: ValueError
         """
-        self.send_command(mkcmd(CMD.SET_DAC, 'hB', int(round(raw)), number), 'hB')[0]
+        self.send_command(mkcmd(CMD.SET_DAC, 'hB', int(round(raw)), number), 'hB')
 
     def set_analog(self, volts, number=1):
         """Set DAC output (volts).
@@ -324,8 +599,9 @@ class DAQ(object):
             raise Warning("Function not implemented in this FW. Try updating")
 
         values = self.send_command(mkcmd(CMD.AIN_ALL, 'BB', nsamples, gain), '8h')
-        return [self.__model.raw_to_volts(v, gain, i, 0) for i, v in
-                enumerate(values)]
+        scale, offset = np.array([self.__model.get_adc_coefs(gain, i, 0)
+                                  for i in range(len(values))]).T
+        return np.round((np.array(values) - offset)*scale, 5).tolist()
 
     def conf_adc(self, pinput=8, ninput=0, gain=0, nsamples=20):
         """Configure the analog-to-digital converter.
@@ -381,7 +657,7 @@ class DAQ(object):
             raise ValueError("digital value out of range")
 
         self.send_command(mkcmd(CMD.PIO, 'BB', number,
-                                int(bool(value))), 'BB')[1]
+                                int(bool(value))), 'BB')
 
     def read_pio(self, number):
         """Read PIO input value (0: low, 1: high).
@@ -418,7 +694,7 @@ class DAQ(object):
         :raises: ValueError
         """
         self.__model.check_port(value)
-        self.send_command(mkcmd(CMD.PORT, 'B', value), 'B')[0]
+        self.send_command(mkcmd(CMD.PORT, 'B', value), 'B')
 
     def read_port(self):
         """Read all PIO values.
@@ -487,7 +763,7 @@ class DAQ(object):
 
         :param edge: high-to-low (False) or low-to-high (True).
         """
-        self.send_command(mkcmd(CMD.COUNTER_INIT, 'B', int(bool(edge))), 'B')[0]
+        self.send_command(mkcmd(CMD.COUNTER_INIT, 'B', int(bool(edge))), 'B')
 
     def get_counter(self, reset):
         """Get the counter value.
@@ -505,7 +781,7 @@ class DAQ(object):
         if not 0 <= period <= 2**32:
             raise ValueError("Period value out of range")
 
-        self.send_command(mkcmd(CMD.CAPTURE_INIT, 'I', period), 'I')[0]
+        self.send_command(mkcmd(CMD.CAPTURE_INIT, 'I', period), 'I')
 
     def stop_capture(self):
         """Stop Capture mode."""
@@ -535,7 +811,7 @@ class DAQ(object):
         if not 0 <= resolution <= 2**32:
             raise ValueError("resolution value out of range")
 
-        self.send_command(mkcmd(CMD.ENCODER_INIT, 'I', resolution), 'I')[0]
+        self.send_command(mkcmd(CMD.ENCODER_INIT, 'I', resolution), 'I')
 
     def get_encoder(self):
         """Get current encoder relative position.
@@ -834,7 +1110,7 @@ class DAQ(object):
             raise LengthError("Invalid data length")
 
         self.set_analog(data[0])
-        values = [self.__model.volts_to_raw(v, 0) for v in data]
+        values = self.__model.volts_to_raw(np.asarray(data), 0).tolist()
         return self.send_command(mkcmd(CMD.SIGNAL_LOAD, 'h%dh' % len(values),
                                        offset, *values), 'Bh')
 
@@ -842,76 +1118,109 @@ class DAQ(object):
         """Flush internal buffers."""
         self.ser.flushInput()
 
-    def __read_stream_packet(self):
-        packet = bytearray(self.ser.read(5))
-        _, cmd, size, ch = struct.unpack('!HBBB', packet)
-
-        if cmd == CMD.STREAM_DATA:
-            body = bytearray(self.ser.read(size - 1))
-            body = escape_bytes(body, (0x7d, 0x7e))
-
-            if self.__debug:
-                print("STRM:", bytes2hex(packet), bytes2hex(body))
+    def __read_stream_packet(self, packet):
+        _, cmd, size, ch = STREAM_HEADER.unpack_from(packet)
+        if self.__debug:
+            print("STRM:", bytes2hex(packet))
 
-            data = struct.unpack('!%dh' % ((size - 4)/2), body[3:])
-            return ch, data
-        elif cmd == CMD.STREAM_STOP:
-            if self.__debug:
-                print("STRM:", bytes2hex(packet))
+        if cmd == CMD.STREAM_STOP:
             return ch, None
-        else:
-            raise IOError("Invalid stream command: %d", cmd)
+
+        # samples are decoded in place, without copying the packet
+        data = np.frombuffer(packet, '>i2', max(size - 4, 0)//2, 8)
+        return ch, data
 
     def __read_stream(self):
         """Generator that reads and parses a stream packet at a time.
+        It ends if the port times out after stop() has been called.
 
         :returns: (data, channel)
             - channel: Assigned experiment number.
             - data: Buffer for data points.
         """
         while True:
-            # wait for a start byte
-            while bytearray(self.ser.read(1))[0] != 0x7e:
-                pass
-            # read a packet
-            try:
-                yield self.__read_stream_packet()
-            except EOFError:
-                break
+            data = self.__read_block()
+            if not data and self.__stopping:
+                # the STREAM_STOP packets have been lost
+                return
+
+            for packet in self.__decoder.feed(data):
+                yield self.__read_stream_packet(packet)
+
+    def __read_block(self):
+        """Read the available bytes of the stream (at least one, unless the
+        port times out, and up to the block size of the decoder)."""
+        size = min(max(self.ser.in_waiting, 1), self.__decoder.blocksize)
+        data = self.__read(size)
+        self.__metrics.record_stream(len(data))
+        return data
+
+    def stream_stats(self):
+        """Counters of the stream decoder since the last call to start().
+
+        :returns: Dictionary with the number of valid packets, bad_packets
+            (discarded because of a wrong checksum, command or channel, or
+            because they were truncated), resyncs (times the decoder skipped
+            bytes to find the start of a packet) and skipped_bytes.
+        """
+        return self.__decoder.stats()
 
     @property
     def is_measuring(self):
         """True if any experiment is going on."""
         return self.__measuring
 
-    def start(self):
-        """Start all available experiments."""
-        if self.__thread and self.__thread.isAlive():
+    def start(self, capture=None):
+        """Start all available experiments.
+
+        :param capture: Path of a capture file. If given, every byte received
+            from the device until the experiments stop is recorded into it,
+            so that it can be played back later (see `port` in DAQ()).
+        """
+        if self.__thread and self.__thread.is_alive():
             return
 
-        # setup the openDAQ
-        for s in self.__exp:
-            if s.__class__ is DAQBurst:
-                self.__create_burst(s.period)
-            elif s.__class__ is DAQStream:
-                self.__create_stream(s.number, s.period)
-            else:
-                self.__create_external(s.number, s.edge)
+        self.__close_capture()
+        if capture is not None:
+            self.__capture = CaptureWriter(capture)
+
+        # setup the openDAQ (all the commands at once)
+        with self.batch():
+            for s in self.__exp:
+                if s.__class__ is DAQBurst:
+                    self.__create_burst(s.period)
+                elif s.__class__ is DAQStream:
+                    self.__create_stream(s.number, s.period)
+                else:
+                    self.__create_external(s.number, s.edge)
+
+                self.__setup_channel(s.number, s.npoints, s.continuous)
+                self.__conf_channel(s.number, s.mode, s.pinput,
+                                    s.ninput, s.gain, s.nsamples)
+                self.__trigger_setup(s.number, s.trg_mode, s.trg_value)
 
-            self.__setup_channel(s.number, s.npoints, s.continuous)
-            self.__conf_channel(s.number, s.mode, s.pinput,
-                                s.ninput, s.gain, s.nsamples)
-            self.__trigger_setup(s.number, s.trg_mode, s.trg_value)
+                if s.get_mode() == ExpMode.ANALOG_OUT:
+                    self.__load_signal(*s.get_preload_data())
+                    break
 
-            if s.get_mode() == ExpMode.ANALOG_OUT:
-                self.__load_signal(*s.get_preload_data())
-                break
+        for s in self.__exp:
+            params = s.get_params()
+            s._set_converter(
+                lambda raw, p=params: self.__model.raw_to_volts(raw, *p))
+            s._set_running(True)
 
         self.__measuring = True
-        self.send_command(mkcmd(CMD.STREAM_START, ''), '')
-        self.__thread = Thread(target=self.__run)
-        self.__thread.daemon = True
-        self.__thread.start()
+        self.__stopping = False
+        with self.__cmd_lock:
+            self.__decoder.reset()
+            self.__decoder.reset_stats()
+            self.__decoder.pending = None
+            self.send_command(mkcmd(CMD.STREAM_START, ''), '')
+            # from now on, the responses are read by the reader thread
+            self.__reading = True
+            self.__thread = Thread(target=self.__run)
+            self.__thread.daemon = True
+            self.__thread.start()
 
     def stop(self, clear=False):
         """Stop all running experiments and exit threads.
@@ -919,28 +1228,55 @@ class DAQ(object):
         :param clear: If True, the experiment list will be cleared. The
         experiments will no longer be available.
         """
-        if self.__thread and self.__thread.isAlive():
+        if self.__thread and self.__thread.is_alive():
+            # release the reader thread if it is blocked on a full buffer
+            for s in self.__exp:
+                s._set_running(False)
+
+            self.__stopping = True
             self.send_command(mkcmd(CMD.STREAM_STOP, ''))
             self.__thread.join() # wait for thread to finish
 
             if clear:
                 self.clear_experiments()
 
+    def __close_capture(self):
+        capture, self.__capture = self.__capture, None
+        if capture is not None:
+            capture.close()
+
     def __run(self):
         """Thread loop.
 
         Store the experiment data sent by the device after calling start().
         """
         used = self.__used_channels()
-        stopped = 0
+        stopped = set()
 
         for ch, data in self.__read_stream():
+            if ch not in used:
+                self.__decoder.reject()
+                continue
+
+            exp = self.__exp[used.index(ch)]
             if data is None:
-                stopped += 1
-                if stopped == len(used):
+                exp._set_running(False)
+                stopped.add(ch)
+                if len(stopped) == len(used):
                     break
+            elif exp.raw:
+                # calibration is applied when the points are read
+                exp.add_points(data)
             else:
-                exp = self.__exp[used.index(ch)]
                 exp.add_points(self.__model.raw_to_volts(data, *exp.get_params()))
 
+        # keep routing the responses of the commands in progress
+        while not self.__cmd_lock.acquire(False):
+            self.__decoder.feed(self.__read_block())
+        self.__reading = False
+        self.__cmd_lock.release()
+
         self.__measuring = False
+        self.__close_capture()
+        for exp in self.__exp:
+            exp._set_running(False)
@@ -20,7 +20,7 @@
 
 
 from __future__ import division
-import time
+import numpy as np
 from collections import namedtuple
 from enum import IntEnum
 
@@ -46,6 +46,72 @@ class PGAGains(IntEnum):
         return a
 
 
+class CalibSlots(list):
+    """List of calibration registers that notifies its changes.
+
+    :param regs: Initial calibration registers.
+    :param on_change: Function called when the list is modified.
+    """
+    def __init__(self, regs, on_change):
+        list.__init__(self, regs)
+        self.on_change = on_change
+
+    def __setitem__(self, index, value):
+        list.__setitem__(self, index, value)
+        self.on_change()
+
+    def __delitem__(self, index):
+        list.__delitem__(self, index)
+        self.on_change()
+
+    def __setslice__(self, i, j, values):  # Python 2
+        list.__setslice__(self, i, j, values)
+        self.on_change()
+
+    def __delslice__(self, i, j):  # Python 2
+        list.__delslice__(self, i, j)
+        self.on_change()
+
+    def __iadd__(self, values):
+        list.__iadd__(self, values)
+        self.on_change()
+        return self
+
+    def __imul__(self, n):
+        list.__imul__(self, n)
+        self.on_change()
+        return self
+
+    def append(self, value):
+        list.append(self, value)
+        self.on_change()
+
+    def extend(self, values):
+        list.extend(self, values)
+        self.on_change()
+
+    def insert(self, index, value):
+        list.insert(self, index, value)
+        self.on_change()
+
+    def pop(self, *args):
+        value = list.pop(self, *args)
+        self.on_change()
+        return value
+
+    def remove(self, value):
+        list.remove(self, value)
+        self.on_change()
+
+    def reverse(self):
+        list.reverse(self)
+        self.on_change()
+
+    def sort(self, *args, **kwargs):
+        list.sort(self, *args, **kwargs)
+        self.on_change()
+
+
 class DAQModel(object):
     """Base class for defining OpenDAQ models by inheritance."""
     _id = 0
@@ -68,6 +134,7 @@ class DAQModel(object):
         self.adc_slots = adc_slots
 
         # Create the calibration slots
+        self.__adc_coefs = {}
         self.adc_calib = [CalibReg(1., 0.)]*adc_slots
         self.dac_calib = [CalibReg(1., 0.)]*dac_slots
 
@@ -78,51 +145,74 @@ class DAQModel(object):
     def serial_str(self):
         return self.serial_fmt % self.serial
 
-    def load_dac_calib(self, read_slot):
+    @property
+    def adc_calib(self):
+        return self.__adc_calib
+
+    @adc_calib.setter
+    def adc_calib(self, regs):
+        self.__adc_calib = CalibSlots(regs, self.__adc_coefs.clear)
+        self.__adc_coefs.clear()
+
+    def load_dac_calib(self, read_slots):
         """Load DAC calibration values.
-        :param read_slot: Callback function that returns the raw
-            calibration values (gain and offset) of a slot, given its index.
+        :param read_slots: Callback function that returns the raw
+            calibration values (gain and offset) of a list of slots, given
+            their indexes.
         """
-        time.sleep(.05)
-        for i in range(len(self.dac_calib)):
-            gain, offset = read_slot(i)
-            self.dac_calib[i] = CalibReg(1. + gain/2.**16, offset/2.**16)
-
-    def load_adc_calib(self, read_slot):
-        time.sleep(.05)
-        for i in range(len(self.adc_calib)):
-            gain, offset = read_slot(i + len(self.dac_calib))
-            self.adc_calib[i] = CalibReg(1. + gain/2.**16, offset/2.**5)
-
-    def write_dac_calib(self, regs, write_slot):
-        """Write DAC calibration values.
-        :param regs: A list of CalibReg objects.
-        :param write_slot: Callback function that writes a calibration slot
-            into the OpenDAQ device, given its index, gain and offset (int16).
+        values = read_slots(list(range(len(self.dac_calib))))
+        self.dac_calib = [CalibReg(1. + gain/2.**16, offset/2.**16)
+                          for gain, offset in values]
+
+    def load_adc_calib(self, read_slots):
+        first = len(self.dac_calib)
+        values = read_slots(list(range(first, first + len(self.adc_calib))))
+        self.adc_calib = [CalibReg(1. + gain/2.**16, offset/2.**5)
+                          for gain, offset in values]
+
+    @staticmethod
+    def __changed_slots(regs, current, first, offset_scale):
+        """Raw values of the calibration slots that differ from the current
+        registers.
+
+        :returns: List of (slot index, gain, offset).
         """
-        if len(regs) != len(self.dac_calib):
-            raise IndexError("Invalid number of calibration registers")
-        time.sleep(.05)
-        for i, reg in enumerate(regs):
-            if type(reg) is not CalibReg:
-                raise ValueError("Registers must be instances of CalibReg")
-            write_slot(i, (reg.gain - 1.)*2**16, reg.offset*2**16)
-            time.sleep(.05)
-            self.dac_calib[i] = reg
-
-    def write_adc_calib(self, regs, write_slot):
-        if len(regs) != len(self.adc_calib):
+        if len(regs) != len(current):
             raise IndexError("Invalid number of calibration registers")
 
-        time.sleep(.05)
-        for i, reg in enumerate(regs):
+        slots = []
+        for i, (reg, old) in enumerate(zip(regs, current)):
             if type(reg) is not CalibReg:
                 raise ValueError("Registers must be instances of CalibReg")
 
-            j = i + len(self.dac_calib)
-            write_slot(j, (reg.gain - 1.)*2**16, reg.offset*2**5)
-            time.sleep(.05)
-            self.adc_calib[i] = reg
+            raw = (int((reg.gain - 1.)*2**16), int(reg.offset*offset_scale))
+            if raw != (int((old.gain - 1.)*2**16),
+                       int(old.offset*offset_scale)):
+                slots.append((first + i,) + raw)
+        return slots
+
+    def write_dac_calib(self, regs, write_slots):
+        """Write DAC calibration values. Only the slots that change are
+        written.
+        :param regs: A list of CalibReg objects.
+        :param write_slots: Callback function that writes calibration slots
+            into the OpenDAQ device, given a list of (index, gain, offset)
+            with the raw values (int16).
+        :returns: Indexes of the written slots.
+        """
+        slots = self.__changed_slots(regs, self.dac_calib, 0, 2**16)
+        if slots:
+            write_slots(slots)
+        self.dac_calib = list(regs)
+        return [slot[0] for slot in slots]
+
+    def write_adc_calib(self, regs, write_slots):
+        slots = self.__changed_slots(regs, self.adc_calib,
+                                     len(self.dac_calib), 2**5)
+        if slots:
+            write_slots(slots)
+        self.adc_calib = list(regs)
+        return [slot[0] for slot in slots]
 
     def check_pio(self, number):
         if not (1 <= number <= self.npios):
@@ -152,15 +242,43 @@ class DAQModel(object):
 
     def raw_to_volts(self, raw, gain_id, pinput, ninput=0):
         """
-        Convert a raw value or a list of values to volts.
+        Convert a raw value, a list of values or an array to volts.
         Device calibration values are used for the calculation.
 
-        :param raw: Value or list of values to be converted.
+        :param raw: Value, list of values or numpy array to be converted.
         :param gain_id: ID of the analog configuration setup.
         :param pinput: Positive input.
         :param ninput: Negative input.
-        :returns: Value in volts.
+        :returns: Value, list or array (float64) in volts.
+        """
+        scale, offset = self.get_adc_coefs(gain_id, pinput, ninput)
+
+        if isinstance(raw, np.ndarray):
+            return np.round((raw - offset)*scale, 5)
+
+        try:
+            return [round((v - offset)*scale, 5) for v in raw]
+        except TypeError:
+            return round((raw - offset)*scale, 5)
+
+    def get_adc_coefs(self, gain_id, pinput, ninput=0):
+        """Return the coefficients that convert raw ADC values to volts:
+        ``volts = (raw - offset)*scale``.
+
+        They are cached for every analog configuration, and recomputed when
+        the ADC calibration changes.
+
+        :param gain_id: ID of the analog configuration setup.
+        :param pinput: Positive input.
+        :param ninput: Negative input.
+        :returns: (scale, offset)
         """
+        key = (gain_id, pinput, ninput)
+        try:
+            return self.__adc_coefs[key]
+        except KeyError:
+            pass
+
         # obtain the calibration gains and offsets
         slot1, slot2 = self._get_adc_slots(gain_id, pinput, ninput)
         gain1, offs1 = (1., 0.) if slot1 < 0 else self.adc_calib[slot1]
@@ -172,24 +290,26 @@ class DAQModel(object):
         gain = adc_gain*pga_gain*gain1*gain2
         offset = offs1 + offs2*pga_gain
 
-        try:
-            return [round((v - offset)/gain, 5) for v in raw]
-        except TypeError:
-            return round((raw - offset)/gain, 5)
+        self.__adc_coefs[key] = (1./gain, offset)
+        return self.__adc_coefs[key]
 
     def __check_dac_value(self, volts):
         if not (self.dac.vmin <= volts <= self.dac.vmax):
             raise ValueError("DAC voltage out of range")
 
     def volts_to_raw(self, volts, number):
-        """Convert a value in volts to a raw value.
+        """Convert a value in volts, or an array of values, to raw values.
         Device calibration values are used for the calculation.
 
-        :param volts: Value to convert to raw.
+        :param volts: Value, list or numpy array of values to convert.
         :param number: Calibration slot of the DAC.
-        :returns: Raw value.
-        :raises: ValueError: DAC voltage out of range
+        :returns: Raw value, or int16 array of raw values.
+        :raises: ValueError: DAC voltage out of range (the indexes of all the
+            invalid values are reported for arrays)
         """
+        if isinstance(volts, (np.ndarray, list, tuple)):
+            return self.__volts_to_raw_array(volts, number)
+
         self.__check_dac_value(volts)
 
         try:
@@ -204,6 +324,27 @@ class DAQModel(object):
         return max(-1 << (self.dac.bits - 1),
                    min(raw, (1 << (self.dac.bits - 1)) - 1))
 
+    def __volts_to_raw_array(self, volts, number):
+        volts = np.asarray(volts, dtype=np.float64)
+
+        valid = (volts >= self.dac.vmin) & (volts <= self.dac.vmax)
+        if not valid.all():
+            raise ValueError("DAC voltage out of range at indexes %s" %
+                             np.flatnonzero(~valid).tolist())
+
+        try:
+            gain, offset = self.dac_calib[number]
+        except IndexError:
+            raise IndexError('Invalid DAC number')
+
+        base_gain = self.dac.vmax/2**(self.dac.bits - 1)
+        raw = np.round((volts - offset)/(gain*base_gain))
+
+        # clamp values between DAC limits
+        np.clip(raw, -1 << (self.dac.bits - 1), (1 << (self.dac.bits - 1)) - 1,
+                out=raw)
+        return raw.astype(np.int16)
+
     @classmethod
     def new(cls, model_id, fw_ver, serial):
         """Factory method for instantiating subclasses of DAQModel."""
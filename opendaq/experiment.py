@@ -18,9 +18,13 @@
 # You should have received a copy of the GNU Lesser General Public License
 # along with opendaq.  If not, see <http://www.gnu.org/licenses/>.
 
+import numpy as np
 from enum import IntEnum
 from collections import deque
-from threading import Lock
+from threading import Condition
+from .common import monotonic
+from .ring_buffer import RingBuffer, SpillFile
+from .subscription import Subscription
 
 
 class ExpMode(IntEnum):
@@ -46,6 +50,14 @@ class Trigger(IntEnum):
     ASML = 20
 
 
+class Overflow(IntEnum):
+    """Policies applied when the buffer of an experiment is full."""
+    DROP_OLDEST = 0     # overwrite the oldest points
+    DROP_NEWEST = 1     # discard the incoming points
+    BLOCK = 2           # stop the reader thread until there is room
+    SPILL = 3           # store the excess points in a temporary file
+
+
 class DAQExperiment(object):
     def analog_setup(self, pinput=1, ninput=0, gain=1, nsamples=20):
         """Configure a channel for a generic stream experiment.
@@ -96,19 +108,330 @@ class DAQExperiment(object):
         self.signal_data = data
         self.signal_offs = offset
 
+    def _init_buffer(self, buffersize, dtype, overflow):
+        """Create the ring buffer of the experiment."""
+        if buffersize < 1:
+            raise ValueError('Invalid buffer size')
+
+        if np.dtype(dtype) not in (np.int16, np.float32, np.float64):
+            raise ValueError('Invalid buffer data type')
+
+        if not type(overflow) is Overflow:
+            raise ValueError('Invalid overflow policy')
+
+        self.overflow = overflow
+        self.raw = np.dtype(dtype) == np.int16
+        self.__converter = None
+        self.__scratch = np.empty(0, np.int16)
+        self.ring_buffer = RingBuffer(buffersize, dtype)
+        self.spill_file = SpillFile(dtype)
+        self.mutex_ring_buffer = Condition()
+        self.subscriptions = []
+        self.__running = False
+        self.__started = False
+        self.__received = 0
+        self.__delivered = 0
+        self.__dropped = 0
+
+        # timebase: number of points sent by the device, index of the next
+        # point to store and to read (counting only the stored points), and
+        # a log of the received packets whose points have not been read
+        self.__nsamples = 0
+        self.__nstored = 0
+        self.__nread = 0
+        self.__anchor = None
+        self.__packets = deque()
+
+    @property
+    def sample_period(self):
+        """Sampling period in seconds (None if it is not known)."""
+        return None
+
+    def _set_running(self, running):
+        """Mark the acquisition as running or finished. Readers waiting for
+        points are woken up when it finishes.
+        """
+        with self.mutex_ring_buffer:
+            self.__running = running
+            if running:
+                # anchor the timebase on the first packet of the run
+                self.__anchor = None
+                self.__started = True
+            self.mutex_ring_buffer.notify_all()
+
+    def _set_converter(self, converter):
+        """Set the function that converts raw counts to volts, when the
+        buffer stores raw values."""
+        self.__converter = converter
+
+    def to_volts(self, points):
+        """Convert points taken from the buffers to volts.
+        Only experiments storing raw counts (int16 buffers) are affected,
+        using the calibration of the channel in a single vectorized
+        operation.
+
+        :param points: Array of points.
+        :returns: Array of points in volts.
+        """
+        if not self.raw:
+            return points
+        if self.__converter is None:
+            return points.astype(np.float64)
+        return self.__converter(points)
+
+    def stats(self):
+        """Return the point counters of the experiment.
+
+        :returns: Dictionary with the number of points received from the
+            device, delivered to the reader, dropped because of an overflow,
+            and currently buffered (in memory and spilled to disk).
+        """
+        with self.mutex_ring_buffer:
+            return {
+                'received': self.__received,
+                'delivered': self.__delivered,
+                'dropped': self.__dropped,
+                'buffered': len(self.ring_buffer) + len(self.spill_file),
+                'spilled': len(self.spill_file),
+            }
+
+    def reset_stats(self):
+        """Reset the received, delivered and dropped counters."""
+        with self.mutex_ring_buffer:
+            self.__received = 0
+            self.__delivered = 0
+            self.__dropped = 0
+
+    def subscribe(self, callback, batch_size=1, max_latency_ms=100,
+                  max_pending=None):
+        """Register a callback to receive the points of the experiment as
+        they arrive. See :class:`.Subscription` for more info.
+
+        :returns: :class:`.Subscription` object.
+        """
+        sub = Subscription(self, callback, batch_size, max_latency_ms,
+                           max_pending)
+        self.subscriptions = self.subscriptions + [sub]
+        return sub
+
+    def unsubscribe(self, sub):
+        """Stop delivering points to a subscriber. Queued points are
+        delivered before returning.
+
+        :param sub: Subscription returned by :meth:`subscribe`.
+        """
+        self.subscriptions = [s for s in self.subscriptions if s is not sub]
+        sub.close()
+
     def add_points(self, points):
-        """Write a single point into the ring buffer."""
-        self.mutex_ring_buffer.acquire()
-        self.ring_buffer.extend(points)
-        self.mutex_ring_buffer.release()
+        """Write an array of points into the ring buffer, applying the
+        overflow policy of the experiment when it gets full."""
+        points = np.asarray(points)
+        buf = self.ring_buffer
+
+        for sub in self.subscriptions:
+            sub.push(points)
+
+        if not len(points):
+            return
+
+        with self.mutex_ring_buffer:
+            npoints = stored = len(points)
+            self.__log_packet(npoints)
+            self.__received += npoints
+
+            if self.overflow == Overflow.DROP_OLDEST:
+                lost = buf.write(points)
+                self.__dropped += lost
+                self.__forget(lost)
+            elif self.overflow == Overflow.DROP_NEWEST:
+                room = buf.capacity - len(buf)
+                buf.write(points[:room])
+                stored = min(len(points), room)
+                self.__dropped += len(points) - stored
+            elif self.overflow == Overflow.SPILL:
+                # keep the order: once spilling, everything goes to disk
+                room = 0 if len(self.spill_file) else buf.capacity - len(buf)
+                buf.write(points[:room])
+                if len(points) > room:
+                    self.spill_file.write(points[room:])
+            else:
+                while len(points):
+                    room = buf.capacity - len(buf)
+                    buf.write(points[:room])
+                    points = points[room:]
+                    self.mutex_ring_buffer.notify_all()
+                    if len(points) and not self.__running:
+                        self.__dropped += len(points)
+                        stored -= len(points)
+                        break
+                    elif len(points):
+                        self.mutex_ring_buffer.wait()
+
+            if stored < npoints:
+                self.__unlog_points(npoints - stored)
+            self.__nstored += stored
+            self.mutex_ring_buffer.notify_all()
+
+    def __log_packet(self, npoints):
+        """Register the arrival of a packet in the timebase."""
+        now = monotonic()
+        period = self.sample_period
+        if period is None:
+            t_first = np.nan
+        else:
+            if self.__anchor is None:
+                # the last point of the first packet was taken on arrival
+                self.__anchor = now - (self.__nsamples + npoints - 1)*period
+            t_first = self.__anchor + self.__nsamples*period
+
+        self.__nsamples += npoints
+        self.__packets.append((self.__nstored, self.__nstored + npoints - 1,
+                               now, t_first))
+
+    def __unlog_points(self, npoints):
+        """Remove from the log the last points of the last packet, which
+        have been discarded."""
+        first, last, arrival, t_first = self.__packets.pop()
+        if last - npoints >= first:
+            self.__packets.append((first, last - npoints, arrival, t_first))
+
+    def __forget(self, npoints):
+        """Advance the read index, discarding the packets already read."""
+        self.__nread += npoints
+        while len(self.__packets) > 1 and self.__packets[1][0] <= self.__nread:
+            self.__packets.popleft()
+
+    def __get_times(self, npoints):
+        """Return the timestamps of the next `npoints` points to read, and
+        forget the packets that have been completely read.
+        """
+        index = np.arange(self.__nread, self.__nread + npoints)
+        log = np.array(self.__packets, dtype=np.float64).reshape(-1, 4)
+        self.__forget(npoints)
+
+        if not len(log):
+            return np.full(npoints, np.nan)
 
-    def read(self):
-        """Return all available points from the ring buffer."""
-        self.mutex_ring_buffer.acquire()
-        ret = list(self.ring_buffer)
-        self.ring_buffer.clear()
-        self.mutex_ring_buffer.release()
-        return ret
+        if self.sample_period is None:
+            # interpolate between the arrival times of the packets
+            return np.interp(index, log[:, 1], log[:, 2])
+
+        pkt = np.maximum(np.searchsorted(log[:, 0], index, 'right') - 1, 0)
+        return log[pkt, 3] + (index - log[pkt, 0])*self.sample_period
+
+    def __available(self):
+        return len(self.ring_buffer) + len(self.spill_file)
+
+    def __wait(self, npoints, timeout):
+        """Wait until the buffers hold `npoints` points, the timeout expires
+        or the experiment finishes (waiting for it to start, if it has not
+        run yet). The ring buffer lock must be held by the caller.
+        """
+        if (npoints > self.ring_buffer.capacity and
+                self.overflow != Overflow.SPILL):
+            raise ValueError("Number of points exceeds the buffer size")
+
+        if timeout is None and not self.__started:
+            # never block forever on an experiment that may not start
+            return self.__available() >= npoints
+
+        deadline = None if timeout is None else monotonic() + timeout
+        while self.__available() < npoints and \
+                (self.__running or not self.__started):
+            if deadline is None:
+                self.mutex_ring_buffer.wait()
+            else:
+                remaining = deadline - monotonic()
+                if remaining <= 0:
+                    break
+                self.mutex_ring_buffer.wait(remaining)
+
+        return self.__available() >= npoints
+
+    def wait_for(self, npoints, timeout=None):
+        """Block until the buffers hold, at least, `npoints` points.
+
+        :param npoints: Number of points to wait for.
+        :param timeout: Maximum waiting time in seconds (None: no limit).
+        :returns: True if the points are available, False if the timeout
+            expired or the experiment finished before receiving them.
+            Before the experiment starts, it waits for it only if there is
+            a timeout (without it, it returns at once).
+        :raises: ValueError: `npoints` exceeds the buffer size.
+        """
+        with self.mutex_ring_buffer:
+            return self.__wait(npoints, timeout)
+
+    def read(self, min_points=0, timeout=None, with_time=False, raw=False):
+        """Return all available points from the buffers.
+
+        :param min_points: Block until, at least, this number of points is
+            available, or the experiment finishes. If it has not started
+            yet, the read waits for it until the timeout expires (without a
+            timeout, it returns at once).
+        :param timeout: Maximum waiting time in seconds (None: no limit).
+            When it expires, the available points are returned.
+        :param with_time: Return also the timestamps of the points.
+        :param raw: Return raw counts instead of volts (only for experiments
+            with int16 buffers).
+        :returns: Array of points, or (times, points) if `with_time` is
+            True. Times are seconds of the host monotonic clock, derived from
+            the experiment period (or interpolated between packet arrivals
+            for External experiments).
+        :raises: ValueError: `min_points` exceeds the buffer size.
+        """
+        with self.mutex_ring_buffer:
+            self.__wait(min_points, timeout)
+            ret = self.ring_buffer.read()
+            if len(self.spill_file):
+                ret = np.concatenate((ret, self.spill_file.read()))
+
+            self.__delivered += len(ret)
+            if with_time:
+                times = self.__get_times(len(ret))
+            else:
+                self.__forget(len(ret))
+            self.mutex_ring_buffer.notify_all()
+
+        if not raw:
+            ret = self.to_volts(ret)
+        return (times, ret) if with_time else ret
+
+    def read_into(self, out, times=None):
+        """Move the available points from the buffers into an array.
+
+        :param out: Destination array. Its length sets the maximum number of
+            points to read. Raw counts are converted to volts when it is a
+            floating point array.
+        :param times: Optional array that receives the timestamps of the
+            points (see :meth:`read`).
+        :returns: Number of points written into `out`.
+        """
+        dest = out
+        with self.mutex_ring_buffer:
+            if self.raw and np.asarray(out).dtype.kind == 'f':
+                # raw counts go through a reusable buffer
+                if len(self.__scratch) < len(dest):
+                    self.__scratch = np.empty(len(dest), np.int16)
+                out = self.__scratch[:len(dest)]
+
+            n = self.ring_buffer.read_into(out)
+            if n < len(out) and len(self.spill_file):
+                spilled = self.spill_file.read(len(out) - n)
+                out[n:n + len(spilled)] = spilled
+                n += len(spilled)
+
+            self.__delivered += n
+            if times is None:
+                self.__forget(n)
+            else:
+                times[:n] = self.__get_times(n)
+            self.mutex_ring_buffer.notify_all()
+
+            if out is not dest:
+                dest[:n] = self.to_volts(out[:n])
+        return n
 
 
 class DAQStream(DAQExperiment):
@@ -121,12 +444,17 @@ class DAQStream(DAQExperiment):
             [0:65536] (0 indicates continuous acquisition).
     :param continuous: Indicates if experiment is continuous (True) or
         one-shot (False).
-    :param buffersize: Buffer size.
+    :param buffersize: Buffer size (maximum number of points).
+    :param dtype: Data type of the buffer (numpy.float32 or numpy.float64,
+        or numpy.int16 to store raw counts, converted to volts on reading).
+    :param overflow: Policy applied when the buffer is full (use
+        :class:`.Overflow`).
     :raises: LengthError (too many experiments at the same time),
         ValueError (values out of range)
     """
     def __init__(self, mode, number, period,
-                 npoints=10, continuous=False, buffersize=1000):
+                 npoints=10, continuous=False, buffersize=1000,
+                 dtype=np.float64, overflow=Overflow.DROP_OLDEST):
         if not 1 <= number <= 4:
             raise ValueError('Invalid number')
 
@@ -142,20 +470,20 @@ class DAQStream(DAQExperiment):
         if not 0 <= npoints < 65536:
             raise ValueError('npoints out of range')
 
-        if not 1 <= buffersize <= 20000:
-            raise ValueError('Invalid buffer size')
-
         self.number = number
         self.period = period
         self.mode = mode
         self.npoints = npoints
         self.continuous = continuous
 
-        self.ring_buffer = deque(maxlen=buffersize)
-        self.mutex_ring_buffer = Lock()
+        self._init_buffer(buffersize, dtype, overflow)
         self.analog_setup()
         self.trigger_setup()
 
+    @property
+    def sample_period(self):
+        return self.period/1000.
+
 
 class DAQExternal(DAQExperiment):
     """External experiment.
@@ -166,12 +494,17 @@ class DAQExternal(DAQExperiment):
     :param npoints: Total number of points for the experiment [0:65536]
     :param continuous: Indicates if the experiment is continuous
         (False: run once, True: continuous).
-    :param buffersize: Buffer size
+    :param buffersize: Buffer size (maximum number of points).
+    :param dtype: Data type of the buffer (numpy.float32 or numpy.float64,
+        or numpy.int16 to store raw counts, converted to volts on reading).
+    :param overflow: Policy applied when the buffer is full (use
+        :class:`.Overflow`).
     :raises: LengthError (too many experiments at the same time,
         ValueError (values out of range)
     """
     def __init__(self, mode, clock_input, edge=1,
-                 npoints=10, continuous=False, buffersize=1000):
+                 npoints=10, continuous=False, buffersize=1000,
+                 dtype=np.float64, overflow=Overflow.DROP_OLDEST):
 
         if not 1 <= clock_input <= 4:
             raise ValueError('Invalid clock_input')
@@ -185,9 +518,6 @@ class DAQExternal(DAQExperiment):
         if not 0 <= npoints < 65536:
             raise ValueError('npoints out of range')
 
-        if not 1 <= buffersize <= 20000:
-            raise ValueError('Invalid buffer size')
-
         if mode == 1 and clock_input != 4:
             raise ValueError('Analog output must use DataChannel 4')
 
@@ -197,8 +527,7 @@ class DAQExternal(DAQExperiment):
         self.npoints = npoints
         self.continuous = continuous
 
-        self.ring_buffer = deque(maxlen=buffersize)
-        self.mutex_ring_buffer = Lock()
+        self._init_buffer(buffersize, dtype, overflow)
         self.analog_setup()
         self.trigger_setup()
 
@@ -211,12 +540,17 @@ class DAQBurst(DAQExperiment):
     :param npoints: Total number of points for the experiment [0:65536]
     :param continuous: Indicates if the experiment is continuous
         (False: run once, True: continuous).
-    :param buffersize: Buffer size
+    :param buffersize: Buffer size (maximum number of points).
+    :param dtype: Data type of the buffer (numpy.float32 or numpy.float64,
+        or numpy.int16 to store raw counts, converted to volts on reading).
+    :param overflow: Policy applied when the buffer is full (use
+        :class:`.Overflow`).
     :raises: LengthError (too many experiments at the same time), ValueError
         (values out of range)
     """
     def __init__(self, mode, period, npoints=10,
-                 continuous=False, buffersize=4000):
+                 continuous=False, buffersize=4000, dtype=np.float64,
+                 overflow=Overflow.DROP_OLDEST):
 
         if not 100 <= period <= 65535:
             raise ValueError('Invalid period')
@@ -233,7 +567,10 @@ class DAQBurst(DAQExperiment):
         self.continuous = continuous
         self.mode = mode
 
-        self.ring_buffer = deque(maxlen=buffersize)
-        self.mutex_ring_buffer = Lock()
+        self._init_buffer(buffersize, dtype, overflow)
         self.analog_setup()
         self.trigger_setup()
+
+    @property
+    def sample_period(self):
+        return self.period/1000000.
@@ -0,0 +1,108 @@
+#!/usr/bin/env python
+
+# Copyright 2016
+# Ingen10 Ingenieria SL
+#
+# This file is part of opendaq.
+#
+# opendaq is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Lesser General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# opendaq is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Lesser General Public License for more details.
+#
+# You should have received a copy of the GNU Lesser General Public License
+# along with opendaq.  If not, see <http://www.gnu.org/licenses/>.
+
+import numpy as np
+
+START_BYTE = 0x7e
+
+
+class FaultInjector(object):
+    """Corrupt the stream frames sent by a simulated device, emulating a
+    noisy link.
+
+    Byte rates are probabilities per byte, frame rates probabilities per
+    frame. A given seed always injects the same faults.
+
+    :param bit_flip: Rate of bytes with one flipped bit.
+    :param drop: Rate of dropped bytes.
+    :param spurious: Rate of spurious start bytes (0x7e) inserted.
+    :param truncate: Rate of frames cut at a random position.
+    :param delay_stop: Rate of STREAM_STOP frames delayed by `stop_delay`.
+    :param stop_delay: Delay of the delayed STREAM_STOP frames (seconds).
+    :param seed: Seed of the random generator (None: unpredictable).
+    """
+    def __init__(self, bit_flip=0., drop=0., spurious=0., truncate=0.,
+                 delay_stop=0., stop_delay=1., seed=None):
+        self.bit_flip = bit_flip
+        self.drop = drop
+        self.spurious = spurious
+        self.truncate = truncate
+        self.delay_stop = delay_stop
+        self.stop_delay = stop_delay
+        self.__random = np.random.RandomState(seed)
+        self.reset_stats()
+
+    def reset_stats(self):
+        """Reset the counters of injected faults."""
+        self.__stats = dict(frames=0, bit_flips=0, dropped=0, spurious=0,
+                            truncated=0, delayed_stops=0)
+
+    def stats(self):
+        """Counters of the faults injected so far.
+
+        :returns: Dictionary with the number of frames processed and of
+            bit_flips, dropped bytes, spurious bytes, truncated frames and
+            delayed_stops.
+        """
+        return dict(self.__stats)
+
+    def corrupt(self, frame):
+        """Apply the faults to a frame.
+
+        :param frame: Bytes of the frame.
+        :returns: Corrupted bytes.
+        """
+        rnd = self.__random
+        stats = self.__stats
+        data = np.frombuffer(bytes(frame), np.uint8).copy()
+        stats['frames'] += 1
+
+        if self.truncate and len(data) > 1 and \
+                rnd.random_sample() < self.truncate:
+            data = data[:rnd.randint(1, len(data))]
+            stats['truncated'] += 1
+
+        if self.bit_flip:
+            flips = rnd.random_sample(len(data)) < self.bit_flip
+            nflips = np.count_nonzero(flips)
+            data[flips] ^= (1 << rnd.randint(0, 8, nflips)).astype(np.uint8)
+            stats['bit_flips'] += nflips
+
+        if self.drop:
+            keep = rnd.random_sample(len(data)) >= self.drop
+            stats['dropped'] += len(data) - np.count_nonzero(keep)
+            data = data[keep]
+
+        if self.spurious:
+            pos = np.flatnonzero(rnd.random_sample(len(data)) < self.spurious)
+            data = np.insert(data, pos, START_BYTE)
+            stats['spurious'] += len(pos)
+
+        return data.tobytes()
+
+    def stop_delayed(self):
+        """Decide whether the next STREAM_STOP frame is delayed.
+
+        :returns: Delay of the frame (seconds), 0 if it is not delayed.
+        """
+        if self.delay_stop and self.__random.random_sample() < self.delay_stop:
+            self.__stats['delayed_stops'] += 1
+            return self.stop_delay
+        return 0.
@@ -0,0 +1,144 @@
+#!/usr/bin/env python
+
+# Copyright 2016
+# Ingen10 Ingenieria SL
+#
+# This file is part of opendaq.
+#
+# opendaq is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Lesser General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# opendaq is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Lesser General Public License for more details.
+#
+# You should have received a copy of the GNU Lesser General Public License
+# along with opendaq.  If not, see <http://www.gnu.org/licenses/>.
+
+from bisect import bisect_left
+from threading import Lock
+from .common import CRCError, LengthError, NAK
+
+# upper bounds of the latency histogram bins (seconds); the last bin holds
+# the slower round trips
+LATENCY_BINS = (1e-4, 2e-4, 5e-4, 1e-3, 2e-3, 5e-3, 1e-2, 2e-2, 5e-2,
+                0.1, 0.2, 0.5, 1., 2., 5.)
+
+ERRORS = ('naks', 'length_errors', 'crc_errors', 'timeouts', 'other_errors')
+
+
+class CommandStats(object):
+    """Counters of a command number.
+
+    :ivar calls: Number of times the command was sent.
+    :ivar bytes_out: Bytes sent.
+    :ivar bytes_in: Bytes received in the responses.
+    :ivar latency: Sum of the round-trip times (seconds).
+    :ivar histogram: Number of round trips in each bin of LATENCY_BINS
+        (plus one bin for the slower ones).
+    """
+    def __init__(self):
+        self.calls = 0
+        self.bytes_out = 0
+        self.bytes_in = 0
+        self.latency = 0.
+        self.min_latency = None
+        self.max_latency = 0.
+        self.histogram = [0] * (len(LATENCY_BINS) + 1)
+        for name in ERRORS:
+            setattr(self, name, 0)
+
+    def to_dict(self):
+        stats = dict(self.__dict__)
+        stats['histogram'] = list(self.histogram)
+        stats['mean_latency'] = self.latency / self.calls if self.calls else 0.
+        return stats
+
+
+class ProtocolMetrics(object):
+    """Aggregated metrics of the commands exchanged with a device.
+
+    Recording a command costs a few counter updates, so it is always on.
+    """
+    def __init__(self):
+        self.__lock = Lock()
+        self.reset()
+
+    def reset(self):
+        """Clear all the counters."""
+        with self.__lock:
+            self.__commands = {}
+            self.__batches = 0
+            self.__stream_bytes = 0
+
+    def record(self, cmd, latency, bytes_out, response, error=None):
+        """Record a command.
+
+        :param cmd: Command number.
+        :param latency: Round-trip time (seconds).
+        :param bytes_out: Length of the command packet.
+        :param response: Received response (empty if none).
+        :param error: Exception raised while parsing the response, if any.
+        """
+        bytes_in = len(response)
+        with self.__lock:
+            stats = self.__commands.get(cmd)
+            if stats is None:
+                stats = self.__commands[cmd] = CommandStats()
+
+            stats.calls += 1
+            stats.bytes_out += bytes_out
+            stats.bytes_in += bytes_in
+            stats.latency += latency
+            if stats.min_latency is None or latency < stats.min_latency:
+                stats.min_latency = latency
+            if latency > stats.max_latency:
+                stats.max_latency = latency
+            stats.histogram[bisect_left(LATENCY_BINS, latency)] += 1
+
+            if error is None:
+                return
+            if not bytes_in:
+                stats.timeouts += 1
+            elif response == NAK:
+                stats.naks += 1
+            elif isinstance(error, CRCError):
+                stats.crc_errors += 1
+            elif isinstance(error, LengthError):
+                stats.length_errors += 1
+            else:
+                stats.other_errors += 1
+
+    def record_batch(self):
+        """Count a batch of commands sent in a single round trip."""
+        with self.__lock:
+            self.__batches += 1
+
+    def record_stream(self, nbytes):
+        """Count the bytes received while the experiments are running."""
+        with self.__lock:
+            self.__stream_bytes += nbytes
+
+    def to_dict(self, names=None):
+        """Snapshot of the metrics.
+
+        :param names: Function mapping command numbers to the keys of the
+            'commands' dictionary (the numbers themselves if None).
+        :returns: Dictionary with the totals of calls, bytes_out, bytes_in
+            and errors, the number of batches and stream_bytes, and the
+            counters of each command under 'commands'.
+        """
+        with self.__lock:
+            commands = dict(
+                ((names(cmd) if names else cmd), stats.to_dict())
+                for cmd, stats in self.__commands.items())
+            metrics = dict(batches=self.__batches,
+                           stream_bytes=self.__stream_bytes,
+                           latency_bins=LATENCY_BINS, commands=commands)
+
+        for key in ('calls', 'bytes_out', 'bytes_in') + ERRORS:
+            metrics[key] = sum(c[key] for c in commands.values())
+        return metrics
@@ -0,0 +1,179 @@
+#!/usr/bin/env python
+
+# Copyright 2016
+# Ingen10 Ingenieria SL
+#
+# This file is part of opendaq.
+#
+# opendaq is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Lesser General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# opendaq is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Lesser General Public License for more details.
+#
+# You should have received a copy of the GNU Lesser General Public License
+# along with opendaq.  If not, see <http://www.gnu.org/licenses/>.
+
+import os
+import tempfile
+import numpy as np
+
+
+class RingBuffer(object):
+    """Fixed-capacity FIFO buffer backed by a preallocated numpy array.
+    When the buffer is full, new points overwrite the oldest ones.
+
+    :param capacity: Maximum number of points.
+    :param dtype: Data type of the points (numpy dtype).
+    :raises: ValueError: Invalid capacity.
+    """
+    def __init__(self, capacity, dtype=np.float64):
+        if capacity < 1:
+            raise ValueError("Invalid buffer capacity")
+
+        self.__data = np.empty(int(capacity), dtype=dtype)
+        self.__start = 0
+        self.__size = 0
+
+    @property
+    def capacity(self):
+        return len(self.__data)
+
+    @property
+    def dtype(self):
+        return self.__data.dtype
+
+    def __len__(self):
+        return self.__size
+
+    def clear(self):
+        """Discard all the points."""
+        self.__start = 0
+        self.__size = 0
+
+    def write(self, points):
+        """Append points to the buffer.
+
+        :param points: Array or list of points.
+        :returns: Number of old points that have been overwritten.
+        """
+        points = np.asarray(points)
+        n = len(points)
+        cap = len(self.__data)
+
+        if n >= cap:
+            lost = self.__size + n - cap
+            self.__data[:] = points[n - cap:]
+            self.__start = 0
+            self.__size = cap
+            return lost
+
+        end = (self.__start + self.__size) % cap
+        first = min(n, cap - end)
+        self.__data[end:end + first] = points[:first]
+        self.__data[:n - first] = points[first:]
+
+        lost = max(self.__size + n - cap, 0)
+        self.__start = (self.__start + lost) % cap
+        self.__size += n - lost
+        return lost
+
+    def read_into(self, out):
+        """Move the oldest points of the buffer into an array.
+
+        :param out: Destination array (its length sets the maximum number of
+            points to read).
+        :returns: Number of points written into `out`.
+        """
+        cap = len(self.__data)
+        n = min(len(out), self.__size)
+        first = min(n, cap - self.__start)
+        out[:first] = self.__data[self.__start:self.__start + first]
+        out[first:n] = self.__data[:n - first]
+
+        self.__start = (self.__start + n) % cap
+        self.__size -= n
+        return n
+
+    def read(self, npoints=None):
+        """Move the oldest points of the buffer into a new array.
+
+        :param npoints: Maximum number of points to read (all if None).
+        :returns: Contiguous array of points.
+        """
+        n = self.__size if npoints is None else min(npoints, self.__size)
+        out = np.empty(n, dtype=self.__data.dtype)
+        self.read_into(out)
+        return out
+
+
+class SpillFile(object):
+    """Unbounded FIFO buffer of points stored in a temporary file.
+
+    :param dtype: Data type of the points (numpy dtype).
+    """
+    def __init__(self, dtype=np.float64):
+        self.__dtype = np.dtype(dtype)
+        self.__file = None
+        self.__start = 0
+        self.__size = 0
+
+    @property
+    def dtype(self):
+        return self.__dtype
+
+    def __len__(self):
+        return self.__size
+
+    def clear(self):
+        """Discard all the points and truncate the file."""
+        if self.__file is not None:
+            self.__file.seek(0)
+            self.__file.truncate()
+        self.__start = 0
+        self.__size = 0
+
+    def close(self):
+        """Discard all the points and delete the file."""
+        if self.__file is not None:
+            self.__file.close()
+            self.__file = None
+        self.__start = 0
+        self.__size = 0
+
+    def write(self, points):
+        """Append points to the end of the file.
+
+        :param points: Array or list of points.
+        """
+        points = np.asarray(points, dtype=self.__dtype)
+        if self.__file is None:
+            self.__file = tempfile.TemporaryFile()
+
+        self.__file.seek(0, os.SEEK_END)
+        self.__file.write(points.tobytes())
+        self.__size += len(points)
+
+    def read(self, npoints=None):
+        """Move the oldest points of the file into a new array.
+
+        :param npoints: Maximum number of points to read (all if None).
+        :returns: Array of points.
+        """
+        n = self.__size if npoints is None else min(npoints, self.__size)
+        if n == 0:
+            return np.empty(0, dtype=self.__dtype)
+
+        itemsize = self.__dtype.itemsize
+        self.__file.seek(self.__start*itemsize)
+        ret = np.frombuffer(self.__file.read(n*itemsize), dtype=self.__dtype)
+
+        self.__start += n
+        self.__size -= n
+        if self.__size == 0:
+            self.clear()
+        return ret.copy()
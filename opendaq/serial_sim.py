@@ -18,32 +18,81 @@
 # You should have received a copy of the GNU Lesser General Public License
 # along with opendaq.  If not, see <http://www.gnu.org/licenses/>.
 
+import math
+import time
+import heapq
 import struct
+from collections import deque
+from threading import RLock
 from functools import wraps
-from .common import check_crc, LengthError, mkcmd
+from .common import check_crc, LengthError, mkcmd, monotonic
+
+HEADER = struct.Struct('!bb')   # command number and payload length
+
+
+USB_PACKET = 64     # bytes delivered at once by a USB-serial bridge
 
 
 class SerialSim(object):
+    """Simulated serial port.
+
+    By default, the responses are available as soon as the commands are
+    written. The link with a real device can be emulated (e.g.
+    byte_rate=11520 for 115200 bauds), which makes read() wait for the data
+    and time out as a real port does.
+
+    :param port: Port name.
+    :param baudrate: Nominal baud rate (informative).
+    :param timeout: Read timeout (seconds), or None to block.
+    :param byte_rate: Maximum number of bytes per second on the wire in each
+        direction (None: unlimited).
+    :param cmd_latency: Time the firmware takes to process a command
+        (seconds).
+    :param latency_timer: Latency timer of the USB-serial bridge (seconds).
+        Packets shorter than USB_PACKET bytes are only delivered when the
+        timer expires. None disables it.
+    :param faults: :class:`.FaultInjector` that corrupts the stream frames
+        (None: no faults).
+    """
     __commands = {}
+    __index = {}    # commands by (number, payload length)
 
-    def __init__(self, port=None, baudrate=9600, timeout=None):
+    def __init__(self, port=None, baudrate=9600, timeout=None, byte_rate=None,
+                 cmd_latency=0., latency_timer=None, faults=None):
         self.port = port
         self.baudrate = baudrate
         self.timeout = timeout
+        self.byte_rate = byte_rate
+        self.cmd_latency = cmd_latency
+        self.latency_timer = latency_timer
+        self.faults = faults
+        self._lock = RLock()
         self._init()
 
     def _init(self):
         self.rts = 1
         self.port_open = True
-        self.NACK = '\x00\xa0\xa0\x00'
+        self.NACK = b'\x00\xa0\xa0\x00'
         self.__out_buf = bytearray()
+        self.__pending = deque()    # (arrival time, data) not read yet
+        self.__wire_free = 0.
+        self.__last_arrival = 0.
+        self.__delayed = []         # heap of (time, frame) held back
+
+    @property
+    def emulate_wire(self):
+        """True if the timing of a real link is being emulated."""
+        return bool(self.byte_rate or self.cmd_latency or self.latency_timer)
 
     @classmethod
     def command(cls, ncmd, cmd_fmt, ret_fmt):
         """Command decorator"""
         def inner_command(f):
-            cmd_len = struct.calcsize(cmd_fmt)
-            cls.__commands[f.__name__] = (f, ncmd, cmd_len, cmd_fmt, ret_fmt)
+            cmd_struct = struct.Struct('!' + cmd_fmt)
+            cmd_len = cmd_struct.size
+            entry = (f, ncmd, cmd_len, cmd_struct, ret_fmt)
+            cls.__commands[f.__name__] = entry
+            cls.__index[ncmd, cmd_len] = entry
 
             def wrapped(*args, **kwargs):
                 return f(*args, **kwargs)
@@ -53,21 +102,23 @@ class SerialSim(object):
 
     def __get_command(self, ncmd, length):
         try:
-            ret = next((e for e in self.__commands.values()
-                        if e[1] == ncmd and e[2] == length))
-        except StopIteration:
+            return self.__index[ncmd, length]
+        except KeyError:
             raise ValueError("Invalid command number")
-        return ret
 
     def __unpack_header(self, data):
         pay_len = len(data) - 4
-        ncmd, length, cmd_data = struct.unpack('!bb%ds' % pay_len,
-                                               check_crc(data))
+        payload = check_crc(data)
+        ncmd, length = HEADER.unpack_from(payload)
+        cmd_data = payload[2:]
         if pay_len != length:
             raise LengthError("Wrong command length")
         return ncmd, length, cmd_data
 
     def __pack_response(self, ncmd, ret_values, fmt=''):
+        if fmt is None:
+            # the command has no response
+            return b''
         if not type(ret_values) is tuple:
             ret_values = (ret_values,)
         return mkcmd(ncmd, fmt, *ret_values)
@@ -80,34 +131,149 @@ class SerialSim(object):
     def exec_command(self, data):
         try:
             ncmd, ln, cmd_data = self.__unpack_header(data)
-            f, _, _, cmd_fmt, ret_fmt = self.__get_command(ncmd, ln)
-            args = struct.unpack('!'+cmd_fmt, cmd_data)
+            f, _, _, cmd_struct, ret_fmt = self.__get_command(ncmd, ln)
+            args = cmd_struct.unpack(cmd_data)
             ret = self.__pack_response(ncmd, f(self, *args), ret_fmt)
         except (LengthError, ValueError):
             return self.NACK
         return ret
 
+    def _output(self, data, delay=0.):
+        """Send data to the host.
+
+        :param data: Bytes to send.
+        :param delay: Time until the data starts being transmitted (seconds).
+        """
+        if not data:
+            return
+        if not self.emulate_wire:
+            self.__out_buf.extend(data)
+            return
+
+        rate = self.byte_rate and float(self.byte_rate)
+        start = max(monotonic() + delay, self.__wire_free)
+        timer = self.latency_timer
+        for i in range(0, len(data), USB_PACKET):
+            piece = data[i:i + USB_PACKET]
+            arrival = start + (i + len(piece))/rate if rate else start
+            if timer and len(piece) < USB_PACKET:
+                # short packets wait for the latency timer of the bridge
+                arrival = math.ceil(arrival/timer)*timer
+            self.__last_arrival = max(arrival, self.__last_arrival)
+            self.__pending.append((self.__last_arrival, piece))
+        self.__wire_free = start + len(data)/rate if rate else start
+
+    def _send_frame(self, frame, stop=False):
+        """Send a stream frame to the host, injecting the configured faults.
+
+        :param frame: Bytes of the frame.
+        :param stop: The frame is a STREAM_STOP (it may be delayed).
+        """
+        faults = self.faults
+        if faults is None:
+            self._output(frame)
+            return
+
+        delay = faults.stop_delayed() if stop else 0.
+        if delay:
+            heapq.heappush(self.__delayed, (monotonic() + delay, frame))
+        else:
+            self._output(faults.corrupt(frame))
+
+    def __poll(self):
+        """Move the data that has reached the host into the input buffer."""
+        self._update()
+        now = monotonic()
+        delayed = self.__delayed
+        while delayed and delayed[0][0] <= now:
+            self._output(self.faults.corrupt(heapq.heappop(delayed)[1]))
+        pending = self.__pending
+        while pending and pending[0][0] <= now:
+            self.__out_buf.extend(pending.popleft()[1])
+
+    def _next_event(self):
+        """Time (monotonic clock) when new data may reach the host, or
+        None."""
+        times = [t for t in (self._next_output(),
+                             self.__pending[0][0] if self.__pending else None,
+                             self.__delayed[0][0] if self.__delayed else None)
+                 if t is not None]
+        return min(times) if times else None
+
+    def _update(self):
+        """Produce the unsolicited output that is due (overridden by the
+        devices that send data on their own)."""
+        pass
+
+    def _next_output(self):
+        """Time (monotonic clock) of the next unsolicited output, or None."""
+        return None
+
     def write(self, data):
         if not self.port_open:
             raise IOError("Port is closed")
 
-        self.__out_buf.extend(self.exec_command(data))
+        data = bytearray(data)
+        with self._lock:
+            self.__poll()
+            # the data may contain several commands
+            pos = 0
+            delay = 0.
+            while pos < len(data):
+                end = pos + 4 + (data[pos + 3] if len(data) > pos + 3 else 0)
+                # the firmware processes the commands one after another
+                delay += self.cmd_latency
+                wire = end/float(self.byte_rate) if self.byte_rate else 0.
+                self._output(self.exec_command(bytes(data[pos:end])),
+                             delay + wire)
+                pos = end
         return len(data)
 
+    def __wait_output(self, size):
+        """Wait until `size` bytes are available or the port times out."""
+        deadline = None if self.timeout is None else (
+            monotonic() + self.timeout)
+
+        while len(self.__out_buf) < size:
+            with self._lock:
+                t = self._next_event()
+            if t is None:
+                if self.emulate_wire and deadline is not None:
+                    # a real port waits for the whole timeout
+                    time.sleep(max(deadline - monotonic(), 0))
+                break
+            if deadline is not None and t > deadline:
+                time.sleep(max(deadline - monotonic(), 0))
+                with self._lock:
+                    self.__poll()
+                break
+            time.sleep(max(t - monotonic(), 0))
+            with self._lock:
+                self.__poll()
+
     def read(self, size=1):
         if not self.port_open:
             raise IOError("Port is closed")
 
-        ret = bytearray()
-        for i in range(size):
-            try:
-                ret.append(self.__out_buf.pop(0))
-            except IndexError:
-                break
-        return bytes(ret)
+        with self._lock:
+            self.__poll()
+        self.__wait_output(size)
+
+        with self._lock:
+            ret = bytes(self.__out_buf[:size])
+            del self.__out_buf[:size]
+        return ret
+
+    @property
+    def in_waiting(self):
+        with self._lock:
+            self.__poll()
+            return len(self.__out_buf)
 
     def flushInput(self):
-        self.__out_buf = bytearray()
+        with self._lock:
+            self.__poll()
+            del self.__out_buf[:]
 
     def open(self):
         self.port_open = True
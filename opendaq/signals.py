@@ -0,0 +1,157 @@
+#!/usr/bin/env python
+
+# Copyright 2016
+# Ingen10 Ingenieria SL
+#
+# This file is part of opendaq.
+#
+# opendaq is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Lesser General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# opendaq is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Lesser General Public License for more details.
+#
+# You should have received a copy of the GNU Lesser General Public License
+# along with opendaq.  If not, see <http://www.gnu.org/licenses/>.
+
+"""Signal sources for the analog inputs of the simulator.
+
+All the sources generate raw ADC values (int16 counts) for whole blocks of
+sample times at once.
+"""
+
+import numpy as np
+
+INT16_MIN = -2**15
+INT16_MAX = 2**15 - 1
+
+
+class Signal(object):
+    """Base class of the signal sources.
+
+    :param offset: DC offset (ADC counts).
+    """
+    def __init__(self, offset=0):
+        self.offset = offset
+
+    def _values(self, t):
+        """Values of the signal (without offset) at the times `t`."""
+        return np.zeros(len(t))
+
+    def samples(self, t):
+        """Generate the samples of the signal.
+
+        :param t: Array of sample times (seconds).
+        :returns: Array of raw ADC values (int16).
+        """
+        t = np.asarray(t, dtype=np.float64)
+        values = np.round(self._values(t) + self.offset)
+        return np.clip(values, INT16_MIN, INT16_MAX).astype(np.int16)
+
+
+class Sine(Signal):
+    """Sine wave.
+
+    :param amplitude: Amplitude (ADC counts).
+    :param freq: Frequency (Hz).
+    :param offset: DC offset (ADC counts).
+    :param phase: Phase at t=0 (radians).
+    """
+    def __init__(self, amplitude=8000, freq=1., offset=0, phase=0.):
+        Signal.__init__(self, offset)
+        self.amplitude = amplitude
+        self.freq = freq
+        self.phase = phase
+
+    def _values(self, t):
+        return self.amplitude*np.sin(2*np.pi*self.freq*t + self.phase)
+
+
+class Square(Signal):
+    """Square wave.
+
+    :param amplitude: Amplitude (ADC counts).
+    :param freq: Frequency (Hz).
+    :param offset: DC offset (ADC counts).
+    :param duty: Fraction of the period at the high level [0:1].
+    :raises: ValueError: Invalid duty cycle.
+    """
+    def __init__(self, amplitude=8000, freq=1., offset=0, duty=0.5):
+        if not 0 <= duty <= 1:
+            raise ValueError("Invalid duty cycle")
+
+        Signal.__init__(self, offset)
+        self.amplitude = amplitude
+        self.freq = freq
+        self.duty = duty
+
+    def _values(self, t):
+        high = np.mod(t*self.freq, 1.) < self.duty
+        return np.where(high, self.amplitude, -self.amplitude)
+
+
+class Ramp(Signal):
+    """Sawtooth wave, rising from -amplitude to +amplitude every period.
+
+    :param amplitude: Amplitude (ADC counts).
+    :param freq: Frequency (Hz).
+    :param offset: DC offset (ADC counts).
+    """
+    def __init__(self, amplitude=8000, freq=1., offset=0):
+        Signal.__init__(self, offset)
+        self.amplitude = amplitude
+        self.freq = freq
+
+    def _values(self, t):
+        return self.amplitude*(2*np.mod(t*self.freq, 1.) - 1)
+
+
+class Noise(Signal):
+    """Gaussian noise. A given seed always produces the same sequence of
+    samples, no matter how they are split into blocks.
+
+    :param sigma: Standard deviation (ADC counts).
+    :param offset: Mean value (ADC counts).
+    :param seed: Seed of the random generator (None: unpredictable).
+    """
+    def __init__(self, sigma=1000, offset=0, seed=None):
+        Signal.__init__(self, offset)
+        self.sigma = sigma
+        self.seed = seed
+        self.__random = np.random.RandomState(seed)
+
+    def _values(self, t):
+        return self.__random.normal(0., self.sigma, len(t))
+
+
+class Replay(Signal):
+    """Replay of an array of raw values, one value per sample.
+
+    :param values: Array of values (ADC counts).
+    :param loop: Start again when the values are exhausted. Otherwise, the
+        last value is repeated.
+    :param offset: DC offset (ADC counts).
+    :raises: ValueError: Empty array.
+    """
+    def __init__(self, values, loop=True, offset=0):
+        values = np.asarray(values, dtype=np.float64)
+        if not len(values):
+            raise ValueError("Empty array of values")
+
+        Signal.__init__(self, offset)
+        self.values = values
+        self.loop = loop
+        self.__pos = 0
+
+    def _values(self, t):
+        index = self.__pos + np.arange(len(t))
+        self.__pos += len(t)
+        if self.loop:
+            index %= len(self.values)
+        else:
+            index = np.minimum(index, len(self.values) - 1)
+        return self.values[index]
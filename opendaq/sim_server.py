@@ -0,0 +1,128 @@
+#!/usr/bin/env python
+
+# Copyright 2016
+# Ingen10 Ingenieria SL
+#
+# This file is part of opendaq.
+#
+# opendaq is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Lesser General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# opendaq is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Lesser General Public License for more details.
+#
+# You should have received a copy of the GNU Lesser General Public License
+# along with opendaq.  If not, see <http://www.gnu.org/licenses/>.
+
+"""Simulated openDAQ served through a pseudo-terminal (POSIX only).
+
+Run it as ``python -m opendaq.sim_server`` (or ``opendaq-sim``) and connect
+to the printed port with ``DAQ('/dev/pts/N')``: the host side goes through
+the real pyserial stack, while the device runs in a separate process.
+"""
+
+from __future__ import print_function
+import os
+import sys
+import tty
+import select
+import argparse
+from .common import monotonic
+from .simulator import DAQSimulator
+
+HEADER_SIZE = 4     # checksum (2 bytes), command and length
+POLL_INTERVAL = 0.05
+BLOCKSIZE = 4096
+
+
+class SimServer(object):
+    """Serve a simulated device on the slave end of a pseudo-terminal.
+
+    :param simulator: Simulated device (a new DAQSimulator if None).
+    """
+    def __init__(self, simulator=None):
+        self.sim = simulator or DAQSimulator(timeout=0)
+        self.__master, self.__slave = os.openpty()
+        tty.setraw(self.__slave)
+        self.port = os.ttyname(self.__slave)
+        self.__buf = bytearray()
+        self.__running = False
+
+    def __commands(self):
+        """Extract the complete command packets received from the host."""
+        buf = self.__buf
+        while len(buf) >= HEADER_SIZE:
+            size = HEADER_SIZE + buf[3]
+            if len(buf) < size:
+                break
+            yield bytes(buf[:size])
+            del buf[:size]
+
+    def poll(self, timeout=POLL_INTERVAL):
+        """Serve the host requests and the stream data for a while.
+
+        :param timeout: Maximum time to wait for a request (seconds).
+        """
+        t = self.sim._next_event()
+        if t is not None:
+            timeout = max(min(t - monotonic(), timeout), 0)
+
+        ready, _, _ = select.select([self.__master], [], [], timeout)
+        if ready:
+            self.__buf.extend(os.read(self.__master, BLOCKSIZE))
+            for command in self.__commands():
+                self.sim.write(command)
+
+        size = self.sim.in_waiting
+        if size:
+            data = self.sim.read(size)
+            while data:
+                data = data[os.write(self.__master, data):]
+
+    def serve_forever(self):
+        self.__running = True
+        while self.__running:
+            self.poll()
+
+    def shutdown(self):
+        """Stop serve_forever() after the current poll."""
+        self.__running = False
+
+    def close(self):
+        os.close(self.__master)
+        os.close(self.__slave)
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description='Simulated openDAQ served through a pseudo-terminal')
+    parser.add_argument('-b', '--byte-rate', type=float,
+                        help='Emulate a link of this many bytes per second '
+                        '(e.g. 11520 for 115200 bauds)')
+    parser.add_argument('-l', '--cmd-latency', type=float, default=0.,
+                        help='Firmware latency of each command (seconds)')
+    parser.add_argument('-t', '--latency-timer', type=float,
+                        help='Latency timer of the USB-serial bridge '
+                        '(seconds)')
+    args = parser.parse_args()
+
+    server = SimServer(DAQSimulator(timeout=0, byte_rate=args.byte_rate,
+                                    cmd_latency=args.cmd_latency,
+                                    latency_timer=args.latency_timer))
+    print(server.port)
+    sys.stdout.flush()
+
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.close()
+
+
+if __name__ == '__main__':
+    main()
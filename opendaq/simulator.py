@@ -18,19 +18,74 @@
 # You should have received a copy of the GNU Lesser General Public License
 # along with opendaq.  If not, see <http://www.gnu.org/licenses/>.
 
-from random import randint
+import copy
+import numpy as np
+from .common import mkstream, monotonic
 from .serial_sim import SerialSim
+from .signals import Noise
 
 NPIOS = 7
 NCALIB = 16
 NINPUTS = 8
 NGAINS = 4
 NDACS = 4
+NCHANNELS = 4
+PACKET_POINTS = 20  # maximum number of points per stream packet
+
+STREAM_DATA = 25
+STREAM_STOP = 80
+ANALOG_OUT = 1
+
+
+class SimChannel(object):
+    """State of a simulated DataChannel.
+
+    :param number: Number of the DataChannel.
+    :param period: Sampling period (seconds), or None for external clocks.
+    """
+    def __init__(self, number, period=None):
+        self.number = number
+        self.period = period
+        self.npoints = 0
+        self.continuous = True
+        self.mode = 0
+        self.pinput = 1
+        self.ninput = 0
+        self.gain = 0
+        self.nsamples = 1
+        self.trg_mode = 0
+        self.trg_value = 0
+        self.reset()
+
+    def reset(self, signal=None):
+        """Prepare the channel for a new run.
+
+        :param signal: Signal source of the channel, owned by it.
+        """
+        self.ticks = 0
+        self.stopped = False
+        self.signal = signal
+
+    @property
+    def clocked(self):
+        """True if the channel is running with an internal clock."""
+        return self.period is not None and not self.stopped
+
+    def due_ticks(self, elapsed):
+        """Number of pending sampling periods after `elapsed` seconds."""
+        ticks = int(elapsed/self.period) - self.ticks
+        if not self.continuous:
+            ticks = min(ticks, self.npoints - self.ticks)
+        return max(ticks, 0)
+
+    @property
+    def finished(self):
+        return not self.continuous and self.ticks >= self.npoints
 
 
 class DAQSimulator(SerialSim):
-    def __init__(self, port=None, baudrate=9600, timeout=None):
-        SerialSim.__init__(self, port, baudrate, timeout)
+    def __init__(self, port=None, baudrate=9600, timeout=None, **kwargs):
+        SerialSim.__init__(self, port, baudrate, timeout, **kwargs)
         self.pios = [0]*NPIOS
         self.pios_dir = [0]*NPIOS
         self.led_color = 0
@@ -41,11 +96,48 @@ class DAQSimulator(SerialSim):
         self.adc_nsamples = 20
         self.calib_gains = [100]*17
         self.calib_offsets = [1]*17
+        self.channels = {}
+        self.streaming = False
+        self.stream_t0 = None
+        self.signals = {}
+        self.clock_t0 = monotonic()
 
         self.hw_ver = 2
         self.fw_ver = 131
         self.dev_id = 456423
 
+    @property
+    def clock(self):
+        """Simulated time (seconds since the simulator was created)."""
+        return monotonic() - self.clock_t0
+
+    def set_signal(self, pinput, signal):
+        """Select the signal source of an analog input.
+
+        :param pinput: Analog input [1:8].
+        :param signal: Signal source (see :mod:`opendaq.signals`), or None
+            to restore the default (seeded Gaussian noise). On STREAM_START,
+            every channel gets its own copy of the source of its input, so
+            channels sharing an input do not share its state.
+        :raises: ValueError: Invalid input.
+        """
+        if not 0 < pinput <= NINPUTS:
+            raise ValueError("Invalid positive input")
+
+        if signal is None:
+            self.signals.pop(pinput, None)
+        else:
+            self.signals[pinput] = signal
+
+    def get_signal(self, pinput):
+        """Signal source of an analog input."""
+        if pinput not in self.signals:
+            self.signals[pinput] = Noise(sigma=4096, seed=pinput)
+        return self.signals[pinput]
+
+    def __read_input(self, pinput):
+        return int(self.get_signal(pinput).samples([self.clock])[0])
+
     @SerialSim.command(18, 'BB', 'BB')
     def cmd_led_w(self, color, nled):
         self.led_color = int(color)
@@ -97,7 +189,7 @@ class DAQSimulator(SerialSim):
 
     @SerialSim.command(1, '', 'h')
     def cmd_read_analog(self):
-        return randint(-2**14, 2**14 - 1)
+        return self.__read_input(self.adc_pinput)
 
     @SerialSim.command(2, 'BBBB', 'hBBBB')
     def cmd_ain_cfg(self, pinput, ninput, gain, nsamples):
@@ -114,15 +206,150 @@ class DAQSimulator(SerialSim):
         self.adc_ninput = ninput
         self.adc_gain = gain
         self.adc_nsamples = nsamples
-        value = randint(-2**14, 2**14 - 1)
+        value = self.__read_input(pinput)
         return value, pinput, ninput, gain, nsamples
 
     @SerialSim.command(39, '', 'BBI')
     def cmd_idconfig(self):
         return self.hw_ver, self.fw_ver, self.dev_id
 
-    @SerialSim.command(36, 'B', 'BHh')
+    @SerialSim.command(36, 'B', 'Bhh')
     def cmd_getcalib(self, index):
         if not 0 <= index <= NCALIB:
             raise ValueError("Invalid calibration index")
         return index, self.calib_gains[index], self.calib_offsets[index]
+
+    @SerialSim.command(37, 'Bhh', 'Bhh')
+    def cmd_setcalib(self, index, gain, offset):
+        if not 0 <= index <= NCALIB:
+            raise ValueError("Invalid calibration index")
+        self.calib_gains[index] = gain
+        self.calib_offsets[index] = offset
+        return index, gain, offset
+
+    def __get_channel(self, number):
+        try:
+            return self.channels[number]
+        except KeyError:
+            raise ValueError("Invalid DataChannel number")
+
+    def __new_channel(self, number, period=None):
+        if not 0 < number <= NCHANNELS:
+            raise ValueError("Invalid DataChannel number")
+        if self.streaming:
+            raise ValueError("Device is streaming")
+        self.channels[number] = SimChannel(number, period)
+
+    @SerialSim.command(19, 'BH', 'BH')
+    def cmd_stream_create(self, number, period):
+        if not 0 < period:
+            raise ValueError("Invalid period")
+        self.__new_channel(number, period/1000.)
+        return number, period
+
+    @SerialSim.command(20, 'BB', 'BB')
+    def cmd_external_create(self, number, edge):
+        self.__new_channel(number)
+        return number, edge
+
+    @SerialSim.command(21, 'H', 'H')
+    def cmd_burst_create(self, period):
+        if not 0 < period:
+            raise ValueError("Invalid period")
+        self.__new_channel(1, period/1e6)
+        return period
+
+    @SerialSim.command(32, 'BHb', 'BHB')
+    def cmd_channel_setup(self, number, npoints, run_once):
+        ch = self.__get_channel(number)
+        ch.npoints = npoints
+        ch.continuous = not run_once or npoints == 0
+        return number, npoints, run_once
+
+    @SerialSim.command(22, 'BBBBBB', 'BBBBBB')
+    def cmd_channel_cfg(self, number, mode, pinput, ninput, gain, nsamples):
+        ch = self.__get_channel(number)
+        ch.mode = mode
+        ch.pinput = pinput
+        ch.ninput = ninput
+        ch.gain = gain
+        ch.nsamples = nsamples
+        return number, mode, pinput, ninput, gain, nsamples
+
+    @SerialSim.command(33, 'BBH', 'BBH')
+    def cmd_trigger_setup(self, number, mode, value):
+        ch = self.__get_channel(number)
+        ch.trg_mode = mode
+        ch.trg_value = value
+        return number, mode, value
+
+    @SerialSim.command(45, 'B', 'B')
+    def cmd_channel_flush(self, number):
+        self.__get_channel(number)
+        return number
+
+    @SerialSim.command(57, 'B', 'B')
+    def cmd_channel_destroy(self, number):
+        self.channels.pop(number, None)
+        return number
+
+    @SerialSim.command(64, '', '')
+    def cmd_stream_start(self):
+        for ch in self.channels.values():
+            ch.reset(copy.deepcopy(self.get_signal(ch.pinput)))
+        self.stream_t0 = monotonic()
+        self.streaming = True
+        return ()
+
+    @SerialSim.command(80, '', None)
+    def cmd_stream_stop(self):
+        if self.streaming:
+            for ch in sorted(self.channels.values(), key=lambda c: c.number):
+                if not ch.stopped:
+                    self.__stop_channel(ch)
+            self.streaming = False
+
+    def _sample(self, ch, npoints):
+        """Generate the raw values of the next points of a channel.
+
+        Point n is sampled at n*period from STREAM_START, so the samples do
+        not depend on the timing of the host.
+        """
+        t = ch.period*np.arange(ch.ticks, ch.ticks + npoints)
+        return ch.signal.samples(t).tolist()
+
+    def __stop_channel(self, ch):
+        ch.stopped = True
+        self._send_frame(mkstream(STREAM_STOP, 'B', ch.number), stop=True)
+
+    def _update(self):
+        if not self.streaming:
+            return
+
+        elapsed = monotonic() - self.stream_t0
+        for ch in sorted(self.channels.values(), key=lambda c: c.number):
+            if not ch.clocked:
+                continue
+
+            ticks = ch.due_ticks(elapsed)
+            if ticks and ch.mode != ANALOG_OUT:
+                values = self._sample(ch, ticks)
+                for i in range(0, ticks, PACKET_POINTS):
+                    points = values[i:i + PACKET_POINTS]
+                    self._send_frame(mkstream(
+                        STREAM_DATA, 'BBBB%dh' % len(points), ch.number,
+                        ch.pinput, ch.ninput, ch.gain, *points))
+            ch.ticks += ticks
+
+            if ch.finished:
+                self.__stop_channel(ch)
+
+        if all(ch.stopped for ch in self.channels.values()):
+            self.streaming = False
+
+    def _next_output(self):
+        times = [(ch.ticks + 1)*ch.period for ch in self.channels.values()
+                 if ch.clocked]
+        if not self.streaming or not times:
+            return None
+        return self.stream_t0 + min(times)
@@ -0,0 +1,264 @@
+#!/usr/bin/env python
+
+# Copyright 2016
+# Ingen10 Ingenieria SL
+#
+# This file is part of opendaq.
+#
+# opendaq is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Lesser General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# opendaq is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Lesser General Public License for more details.
+#
+# You should have received a copy of the GNU Lesser General Public License
+# along with opendaq.  If not, see <http://www.gnu.org/licenses/>.
+
+from collections import deque
+from threading import Event
+from .common import escape_bytes, check_stream_crc, NAK
+
+START_BYTE = b'\x7e'
+ESCAPE = 0x7d
+HEADER_SIZE = 4     # checksum (2 bytes), command and length
+BLOCKSIZE = 4096
+
+
+class PendingResponses(object):
+    """Command responses awaited while the stream is being decoded.
+
+    Responses are not escaped nor preceded by a start byte: they are found
+    between stream packets and routed here by :class:`StreamDecoder`.
+
+    :param lengths: Expected length of each response.
+    :param commands: Command number of each response.
+    """
+    def __init__(self, lengths, commands):
+        self.lengths = deque(lengths)
+        self.commands = deque(commands)
+        self.responses = []
+        self.done = Event()
+        if not self.lengths:
+            self.done.set()
+
+    def add(self, data):
+        """Store the next response."""
+        self.responses.append(data)
+        self.lengths.popleft()
+        self.commands.popleft()
+        if not self.lengths:
+            self.done.set()
+
+    def wait(self, timeout=None):
+        """Wait for all the responses.
+
+        :returns: True if they have all been received.
+        """
+        return self.done.wait(timeout)
+
+
+class StreamDecoder(object):
+    """Incremental decoder of stream packets.
+
+    Raw bytes are accumulated into an internal buffer and every complete
+    packet found in it is returned unescaped (start byte excluded).
+    Incomplete packets are kept until the rest of their bytes arrive.
+
+    Packets with a wrong checksum or an unexpected command, and packets cut
+    by the start of the next one, are discarded. The decoding goes on from
+    the next start byte, so no other packet is lost.
+
+    When `pending` is set to a :class:`PendingResponses`, the command
+    responses found between packets are routed to it until it is done. The
+    decoder never clears it: that is up to whoever set it. Only a NAK or a
+    packet with the expected command, length and checksum is taken as a
+    response, so damaged packets next to it are discarded as usual.
+
+    :param blocksize: Maximum number of bytes read from the port at once.
+    :param commands: Valid command numbers (None: any command).
+    """
+    def __init__(self, blocksize=BLOCKSIZE, commands=None):
+        self.blocksize = blocksize
+        self.commands = commands
+        self.pending = None
+        self.__buf = bytearray()
+        self.reset_stats()
+
+    def reset(self):
+        """Discard any buffered data."""
+        del self.__buf[:]
+
+    def reset_stats(self):
+        """Reset the decoding counters."""
+        self.packets = 0
+        self.bad_packets = 0
+        self.resyncs = 0
+        self.skipped_bytes = 0
+
+    def reject(self):
+        """Count the last packet returned by :meth:`feed` as bad, because
+        the consumer discarded it (e.g. an unknown channel)."""
+        self.packets -= 1
+        self.bad_packets += 1
+
+    def stats(self):
+        """Decoding counters.
+
+        :returns: Dictionary with the number of valid packets, bad_packets
+            (discarded packets), resyncs (times the decoder skipped bytes to
+            find a start byte) and skipped_bytes.
+        """
+        return dict(packets=self.packets, bad_packets=self.bad_packets,
+                    resyncs=self.resyncs, skipped_bytes=self.skipped_bytes)
+
+    def __valid(self, packet):
+        if not check_stream_crc(packet[:HEADER_SIZE], packet[HEADER_SIZE:]):
+            return False
+        return self.commands is None or packet[2] in self.commands
+
+    @staticmethod
+    def __raw_size(segment, size):
+        """Number of bytes of an escaped segment that hold `size` unescaped
+        bytes."""
+        n = size
+        while True:
+            escapes = segment.count(ESCAPE, 0, n)
+            if size + escapes == n:
+                return n
+            n = size + escapes
+
+    def __skip(self, nbytes):
+        if nbytes:
+            self.resyncs += 1
+            self.skipped_bytes += nbytes
+
+    def __find_response(self, pos, pending):
+        """Find the next response awaited by `pending`: a NAK packet, or a
+        packet with the expected command, length and checksum.
+
+        :returns: (position, size) of the response, or None if it may not
+            have been received yet.
+        """
+        buf = self.__buf
+        length = pending.lengths[0]
+        nak = buf.find(NAK, pos)
+        cmd = bytearray((pending.commands[0],))
+        i = buf.find(cmd, pos + 2) - 2
+        while i >= pos and (nak < 0 or i < nak):
+            if i + length > len(buf):
+                if i + 3 >= len(buf) or buf[i + 3] == length - HEADER_SIZE:
+                    # wait for the rest of the response
+                    return None
+            elif buf[i + 3] == length - HEADER_SIZE and check_stream_crc(
+                    buf[i:i + HEADER_SIZE], buf[i + HEADER_SIZE:i + length]):
+                return i, length
+            i = buf.find(cmd, i + 3) - 2
+        return None if nak < 0 else (nak, len(NAK))
+
+    def __decode(self, pos, limit, packets, final):
+        """Decode the packets in the buffer between `pos` and `limit`.
+
+        :param packets: List where the valid packets are appended.
+        :param final: No more bytes of these packets will arrive, so an
+            incomplete packet at the end is discarded.
+        :returns: Position of the first byte not decoded.
+        """
+        buf = self.__buf
+        while True:
+            start = buf.find(START_BYTE, pos, limit)
+            if start < 0:
+                # no packets left, discard the junk bytes
+                self.__skip(limit - pos)
+                return limit
+            self.__skip(start - pos)
+
+            # escaped packets never contain a start byte
+            end = buf.find(START_BYTE, start + 1, limit)
+            stop = limit if end < 0 else end
+            packet = escape_bytes(buf[start + 1:stop], (0x7d, 0x7e))
+
+            if len(packet) >= HEADER_SIZE:
+                size = HEADER_SIZE + max(packet[3], 1)
+                if len(packet) >= size:
+                    packet = packet[:size]
+                    if self.__valid(packet):
+                        packets.append(packet)
+                        self.packets += 1
+                    else:
+                        self.bad_packets += 1
+                    pos = stop
+                    continue
+
+            if end < 0 and not final:
+                # wait for the rest of the packet
+                return start
+
+            # truncated packet
+            self.bad_packets += 1
+            pos = stop
+
+    def __decode_valid(self, pos, packets):
+        """Decode the valid packets found one after another at `pos`,
+        leaving the bytes that may belong to a command response.
+
+        A packet is only taken once the next one starts, because a packet
+        that lost its last bytes may look valid with the first bytes of the
+        response.
+
+        :param packets: List where the packets are appended.
+        :returns: Position of the first byte not decoded.
+        """
+        buf = self.__buf
+        while buf[pos:pos + 1] == START_BYTE:
+            end = buf.find(START_BYTE, pos + 1)
+            segment = buf[pos + 1:len(buf) if end < 0 else end]
+            packet = escape_bytes(segment, (0x7d, 0x7e))
+            if len(packet) < HEADER_SIZE:
+                break
+            size = HEADER_SIZE + max(packet[3], 1)
+            if len(packet) < size or not self.__valid(packet[:size]):
+                break
+            stop = pos + 1 + self.__raw_size(segment, size)
+            if buf[stop:stop + 1] != START_BYTE:
+                break
+            packets.append(packet[:size])
+            self.packets += 1
+            pos = stop
+        return pos
+
+    def feed(self, data):
+        """Append raw data to the buffer and extract the complete packets.
+
+        :param data: Raw bytes received from the device.
+        :returns: List of unescaped packets.
+        """
+        buf = self.__buf
+        buf.extend(data)
+        packets = []
+        pos = 0
+
+        while True:
+            # the owner of `pending` clears it, another command may be
+            # pending by then
+            pending = self.pending
+            if pending is None or pending.done.is_set():
+                pos = self.__decode(pos, len(buf), packets, False)
+                break
+
+            found = self.__find_response(pos, pending)
+            if found is None:
+                pos = self.__decode_valid(pos, packets)
+                break
+
+            # the response ends the packets before it, even if truncated
+            start, size = found
+            self.__decode(pos, start, packets, True)
+            pending.add(bytes(buf[start:start + size]))
+            pos = start + size
+
+        del buf[:pos]
+        return packets
@@ -0,0 +1,159 @@
+#!/usr/bin/env python
+
+# Copyright 2016
+# Ingen10 Ingenieria SL
+#
+# This file is part of opendaq.
+#
+# opendaq is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Lesser General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# opendaq is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Lesser General Public License for more details.
+#
+# You should have received a copy of the GNU Lesser General Public License
+# along with opendaq.  If not, see <http://www.gnu.org/licenses/>.
+
+import logging
+import numpy as np
+from collections import deque, namedtuple
+from threading import Thread, Condition
+from .common import monotonic
+
+log = logging.getLogger(__name__)
+
+BatchInfo = namedtuple('BatchInfo', ['number', 'mode', 'pinput', 'ninput',
+                                     'gain', 'index'])
+
+
+class Subscription(object):
+    """Push-based delivery of the points of an experiment.
+
+    Points are queued by the acquisition thread and delivered in batches to
+    a callback from a dedicated dispatcher thread, so a slow callback never
+    blocks the serial reader.
+
+    :param experiment: Experiment that produces the points.
+    :param callback: Function called as ``callback(data, info)``, where
+        `data` is an array of points and `info` a :class:`BatchInfo` with the
+        channel settings and the index of the first point of the batch.
+    :param batch_size: Number of points that triggers a delivery.
+    :param max_latency_ms: Maximum time (milliseconds) a point waits before
+        being delivered, even if the batch is not complete.
+    :param max_pending: Maximum number of queued points (None: no limit).
+        The oldest points are dropped when it is exceeded.
+    """
+    def __init__(self, experiment, callback, batch_size=1, max_latency_ms=100,
+                 max_pending=None):
+        if batch_size < 1:
+            raise ValueError("Invalid batch size")
+
+        if max_latency_ms < 0:
+            raise ValueError("Invalid maximum latency")
+
+        self.experiment = experiment
+        self.callback = callback
+        self.batch_size = batch_size
+        self.max_latency = max_latency_ms/1000.
+        self.max_pending = max_pending
+        self.dropped = 0
+        self.delivered = 0
+
+        self.__pending = deque()
+        self.__npending = 0
+        self.__index = 0
+        self.__first_time = None
+        self.__closed = False
+        self.__cond = Condition()
+
+        self.__thread = Thread(target=self.__run)
+        self.__thread.daemon = True
+        self.__thread.start()
+
+    @property
+    def is_active(self):
+        return not self.__closed
+
+    def push(self, points):
+        """Queue an array of points (called by the acquisition thread)."""
+        if not len(points):
+            return
+
+        with self.__cond:
+            if self.__first_time is None:
+                # start the latency timer of the dispatcher
+                self.__first_time = monotonic()
+                self.__cond.notify()
+            self.__pending.append(points)
+            self.__npending += len(points)
+
+            if self.max_pending is not None:
+                while self.__npending > self.max_pending:
+                    lost = len(self.__pending.popleft())
+                    self.__npending -= lost
+                    self.__index += lost
+                    self.dropped += lost
+
+            if self.__npending >= self.batch_size:
+                self.__cond.notify()
+
+    def close(self):
+        """Deliver the queued points and stop the dispatcher thread."""
+        with self.__cond:
+            self.__closed = True
+            self.__cond.notify()
+        self.__thread.join()
+
+    def __wait_batch(self):
+        """Wait until a batch is ready to be delivered.
+
+        :returns: List of arrays to deliver and index of its first point, or
+            None to stop the thread.
+        """
+        with self.__cond:
+            while True:
+                if self.__npending >= self.batch_size or (
+                        self.__closed and self.__npending):
+                    break
+                if self.__closed:
+                    return None
+
+                if self.__first_time is None:
+                    self.__cond.wait()
+                    continue
+
+                remaining = self.__first_time + self.max_latency - monotonic()
+                if remaining <= 0:
+                    break
+                self.__cond.wait(remaining)
+
+            chunks = list(self.__pending)
+            index = self.__index
+            self.__index += self.__npending
+            self.__pending.clear()
+            self.__npending = 0
+            self.__first_time = None
+            return chunks, index
+
+    def __run(self):
+        """Dispatcher thread loop."""
+        while True:
+            batch = self.__wait_batch()
+            if batch is None:
+                break
+
+            chunks, index = batch
+            data = chunks[0] if len(chunks) == 1 else np.concatenate(chunks)
+            exp = self.experiment
+            data = exp.to_volts(data)
+            info = BatchInfo(exp.number, exp.mode, exp.pinput, exp.ninput,
+                             exp.gain, index)
+            self.delivered += len(data)
+            try:
+                self.callback(data, info)
+            except Exception:
+                log.exception("Error in subscriber callback")
@@ -37,7 +37,8 @@ setup(
     test_suite='tests',
     platforms=['any'],
     entry_points={
-        'console_scripts': ['opendaq-utils = opendaq.utils:main']
+        'console_scripts': ['opendaq-utils = opendaq.utils:main',
+                            'opendaq-sim = opendaq.sim_server:main']
     },
     classifiers=[
         'Development Status :: 4 - Beta',
@@ -0,0 +1,49 @@
+import os
+import shutil
+import tempfile
+import unittest
+from opendaq import DAQ
+from opendaq.daq import CMD
+from opendaq.daq_model import CalibReg
+from opendaq.calib_cache import CalibCache
+
+
+class TestCalibCache(unittest.TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+        self.path = os.path.join(self.tmpdir, 'calib.json')
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir)
+
+    def test_cache(self):
+        cache = CalibCache(self.path)
+        key = CalibCache.key(2, 131, 10)
+        assert cache.get(key) is None
+
+        dac = [CalibReg(1.5, 0.25)]
+        adc = [CalibReg(1., 0.), CalibReg(0.5, -3.)]
+        cache.put(key, dac, adc)
+        cache.put(CalibCache.key(2, 140, 10), adc, dac)
+        assert CalibCache(self.path).get(key) == (dac, adc)
+        assert os.listdir(self.tmpdir) == ['calib.json']
+
+    def test_corrupted(self):
+        with open(self.path, 'w') as f:
+            f.write('{"2-131-10": ')
+        assert CalibCache(self.path).get(CalibCache.key(2, 131, 10)) is None
+
+    def test_daq(self):
+        daq = DAQ('sim', calib_cache=self.path)
+        slots = daq.metrics()['commands'][CMD.GET_CALIB]['calls']
+        assert slots == len(daq.get_dac_calib()) + len(daq.get_adc_calib())
+        adc = daq.get_adc_calib()
+        adc[0] = CalibReg(1.25, 10.)
+        daq.set_adc_calib(adc)
+        daq.close()
+
+        # the device is not queried again
+        daq = DAQ('sim', calib_cache=self.path)
+        assert CMD.GET_CALIB not in daq.metrics()['commands']
+        assert daq.get_adc_calib() == adc
+        daq.close()
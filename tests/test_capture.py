@@ -0,0 +1,68 @@
+import os
+import shutil
+import tempfile
+import unittest
+import numpy as np
+from opendaq import DAQ, ExpMode
+from opendaq.common import mkcmd, mkstream
+from opendaq.capture import CaptureWriter, read_capture
+
+
+class TestCapture(unittest.TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+        self.path = os.path.join(self.tmpdir, 'stream.cap')
+
+        # responses to the setup commands, followed by the stream packets
+        self.chunks = [
+            mkcmd(19, 'BH', 1, 10),
+            mkcmd(32, 'BHB', 1, 5, 1),
+            mkcmd(22, 'BBBBBB', 1, 0, 1, 0, 0, 20),
+            mkcmd(33, 'BBH', 1, 0, 0),
+            mkcmd(64, ''),
+            mkstream(25, 'BBBB3h', 1, 1, 0, 0, 100, -200, 0x7e7d),
+            mkstream(25, 'BBBB2h', 1, 1, 0, 0, 0x7d, 5),
+            mkstream(80, 'B', 1),
+        ]
+        writer = CaptureWriter(self.path)
+        for chunk in self.chunks:
+            writer.write(chunk)
+        writer.close()
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir)
+
+    def test_read_capture(self):
+        records = list(read_capture(self.path))
+        assert [data for _, data in records] == self.chunks
+        times = [t for t, _ in records]
+        assert times == sorted(times)
+
+    def test_invalid_file(self):
+        with open(self.path, 'wb') as f:
+            f.write(b'garbage')
+        self.assertRaises(IOError, list, read_capture(self.path))
+
+    def test_replay(self):
+        daq = DAQ('replay-fast:' + self.path)
+        stream = daq.create_stream(ExpMode.ANALOG_IN, 10, npoints=5,
+                                   dtype=np.int16)
+        stream.analog_setup(pinput=1, gain=0)
+        daq.start()
+        data = stream.read(min_points=5, timeout=5, raw=True)
+        daq.stop()
+        daq.close()
+        assert data.tolist() == [100, -200, 0x7e7d, 0x7d, 5]
+
+    def test_record(self):
+        path = os.path.join(self.tmpdir, 'copy.cap')
+        daq = DAQ('replay-fast:' + self.path)
+        stream = daq.create_stream(ExpMode.ANALOG_IN, 10, npoints=5)
+        stream.analog_setup(pinput=1, gain=0)
+        daq.start(capture=path)
+        stream.read(min_points=5, timeout=5)
+        daq.stop()
+        daq.close()
+
+        recorded = b''.join(data for _, data in read_capture(path))
+        assert recorded == b''.join(self.chunks)
@@ -1,5 +1,8 @@
 import unittest
-from opendaq.common import crc, check_crc, CRCError, bytes2hex, mkcmd, escape_bytes
+import random
+from opendaq.common import crc, check_crc, CRCError, bytes2hex, mkcmd
+from opendaq.common import escape_bytes, stuff_bytes, get_struct
+from opendaq.common import parse_command, LengthError
 
 
 class TestCommon(unittest.TestCase):
@@ -29,7 +32,45 @@ class TestCommon(unittest.TestCase):
         assert bytes2hex(mkcmd(18, 'b', 1)) == '00 14 12 01 01'
         assert bytes2hex(mkcmd(100, 'bH', 32, 1000)) == '01 72 64 03 20 03 e8'
 
+    def test_get_struct(self):
+        st = get_struct('!BBhB')
+        assert st.size == 5
+        assert get_struct('!BBhB') is st
+
+    def test_parse_command(self):
+        packet = mkcmd(100, 'bH', 32, 1000)
+        assert parse_command(packet, '!BBbH', 7) == (32, 1000)
+        self.assertRaises(LengthError, parse_command, packet, '!BBbH', 8)
+        self.assertRaises(IOError, parse_command, mkcmd(160, ''), '!BB', 4)
+
     def test_escape_bytes(self):
         a = bytearray([0xff, 0x00, 0x7e, 0x34, 0x89, 0x7d, 0xaa])
         b = bytearray([0xff, 0x00, 0x14, 0x89, 0x8a])
         assert escape_bytes(a, (0x7e, 0x7d)) == b
+
+    def test_escape_bytes_bulk(self):
+        def escape_bytes_loop(data, escape_codes):
+            newdata = bytearray()
+            escape = False
+            for b in data:
+                if b in escape_codes:
+                    escape = True
+                elif escape:
+                    newdata.append(b ^ 0x20)
+                    escape = False
+                else:
+                    newdata.append(b)
+            return newdata
+
+        rnd = random.Random(0)
+        for size in (0, 1, 2, 10, 100, 1000, 5000):
+            for values in ([0x7d, 0x7e, 0x00, 0x5d], list(range(256))):
+                data = bytearray(rnd.choice(values) for i in range(size))
+                assert (escape_bytes(data, (0x7e, 0x7d)) ==
+                        escape_bytes_loop(data, (0x7e, 0x7d)))
+
+    def test_stuff_bytes(self):
+        a = bytearray([0xff, 0x00, 0x7e, 0x34, 0x7d, 0xaa])
+        b = bytearray([0xff, 0x00, 0x7d, 0x5e, 0x34, 0x7d, 0x5d, 0xaa])
+        assert stuff_bytes(a) == b
+        assert escape_bytes(stuff_bytes(a), (0x7e, 0x7d)) == a
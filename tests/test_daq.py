@@ -1,5 +1,13 @@
+import time
 import unittest
-from opendaq import DAQ, LedColor
+from threading import Thread
+import numpy as np
+from opendaq import DAQ, LedColor, ExpMode
+from opendaq.daq import CMD
+from opendaq.common import mkcmd
+from opendaq.daq_model import CalibReg
+from opendaq.signals import Replay
+from opendaq.faults import FaultInjector
 
 
 class TestDAQ(unittest.TestCase):
@@ -39,3 +47,255 @@ class TestDAQ(unittest.TestCase):
             assert self.sim.pios_dir[pio] == 1
             self.daq.set_pio_dir(pio + 1, 0)
             assert self.sim.pios_dir[pio] == 0
+
+    def test_batch(self):
+        with self.daq.batch() as b:
+            self.daq.set_led(LedColor.RED)
+            assert self.daq.set_pio(2, 1) is None
+            index = b.send_command(mkcmd(CMD.PIO, 'B', 2), 'BB')
+        assert len(b) == 3
+        assert self.sim.led_color == LedColor.RED
+        assert b.result(index) == (2, 1)
+        assert not b.errors
+
+    def test_batch_error(self):
+        # a NAK does not make the batch wait for the port timeout
+        self.sim.timeout = 2
+        self.sim.byte_rate = 11520
+        t0 = time.time()
+        with self.assertRaises(IOError):
+            with self.daq.batch() as b:
+                self.daq.set_pio(1, 1)
+                b.send_command(mkcmd(CMD.PIO, 'B', 9), 'BB')  # invalid PIO
+                self.daq.set_pio(2, 1)
+        assert b.results[0] == (1, 1)
+        assert isinstance(b.results[1], IOError)
+        assert b.results[2] == (2, 1)
+        assert self.sim.pios[:2] == [1, 1]
+        assert time.time() - t0 < 1
+
+    def test_batch_exception(self):
+        # nothing is sent if the block fails
+        with self.assertRaises(ValueError):
+            with self.daq.batch():
+                self.daq.set_pio(1, 1)
+                raise ValueError
+        assert self.sim.pios[0] == 0
+        assert self.daq.read_pio(1) == 0
+
+    def test_calib(self):
+        adc = self.daq.get_adc_calib()
+        adc[2] = CalibReg(1.25, -2.)
+        self.daq.reset_metrics()
+        slot = len(self.daq.get_dac_calib()) + 2
+        assert self.daq.set_adc_calib(adc) == [slot]
+        assert self.daq.get_adc_calib() == adc
+
+        # one batch to write, another one to verify
+        metrics = self.daq.metrics()
+        assert metrics['batches'] == 2 and metrics['calls'] == 2
+        assert self.daq.set_adc_calib(adc) == []
+
+    def test_calib_verify(self):
+        class ReadOnly(list):
+            def __setitem__(self, index, value):
+                pass
+
+        self.sim.calib_gains = ReadOnly(self.sim.calib_gains)
+        dac = [CalibReg(1.25, 0.)]*len(self.daq.get_dac_calib())
+        self.assertRaises(IOError, self.daq.set_dac_calib, dac)
+        assert self.daq.metrics()['commands'][CMD.SET_CALIB]['calls'] == 3
+
+    def test_metrics(self):
+        self.daq.reset_metrics()
+        self.daq.get_info()
+        self.daq.set_led(LedColor.RED)
+        with self.daq.batch():
+            self.daq.set_led(LedColor.GREEN)
+            self.daq.set_pio(1, 1)
+        self.assertRaises(IOError, self.daq.send_command, mkcmd(99, ''), '')
+        self.sim.write = lambda data: None
+        self.assertRaises(ValueError, self.daq.get_info)
+
+        metrics = self.daq.metrics()
+        assert metrics['calls'] == 6 and metrics['batches'] == 1
+        assert metrics['timeouts'] == 1 and metrics['naks'] == 1
+        assert metrics['commands'][99]['naks'] == 1
+        info = metrics['commands'][CMD.ID_CONFIG]
+        assert info['calls'] == 2
+        assert info['bytes_in'] == 10 and info['bytes_out'] == 8
+        assert sum(info['histogram']) == 2
+        assert 0 < info['min_latency'] <= info['max_latency']
+        assert metrics['commands'][CMD.LED_W]['calls'] == 2
+
+        self.daq.reset_metrics()
+        assert self.daq.metrics()['calls'] == 0
+
+
+class TestDAQStreaming(unittest.TestCase):
+    def setUp(self):
+        self.daq = DAQ('sim')
+        self.sim = self.daq.ser
+
+    def tearDown(self):
+        self.daq.stop()
+        self.daq.close()
+
+    def wait_stopped(self, timeout=5):
+        t0 = time.time()
+        while self.daq.is_measuring and time.time() - t0 < timeout:
+            time.sleep(0.01)
+        assert not self.daq.is_measuring
+
+    def test_stream(self):
+        stream = self.daq.create_stream(ExpMode.ANALOG_IN, 1, npoints=50)
+        stream.analog_setup(pinput=1, gain=0)
+        self.daq.start()
+        self.wait_stopped()
+        data = stream.read()
+        assert len(data) == 50
+        assert not self.sim.streaming
+
+    def test_two_streams(self):
+        s1 = self.daq.create_stream(ExpMode.ANALOG_IN, 1, npoints=30)
+        s1.analog_setup(pinput=1, gain=0)
+        s2 = self.daq.create_stream(ExpMode.ANALOG_IN, 2, npoints=15)
+        s2.analog_setup(pinput=2, gain=0)
+        self.daq.start()
+        self.wait_stopped()
+        assert len(s1.read()) == 30
+        assert len(s2.read()) == 15
+
+    def test_continuous_stop(self):
+        stream = self.daq.create_stream(ExpMode.ANALOG_IN, 1, continuous=True)
+        stream.analog_setup(pinput=1, gain=0)
+        self.daq.start()
+        data = stream.read(min_points=20, timeout=5)
+        self.daq.stop()
+        assert len(data) >= 20
+        assert not self.daq.is_measuring
+        assert not self.sim.streaming
+
+    def test_restart(self):
+        stream = self.daq.create_stream(ExpMode.ANALOG_IN, 1, npoints=10)
+        stream.analog_setup(pinput=1, gain=0)
+        for i in range(2):
+            self.daq.start()
+            self.wait_stopped()
+            assert len(stream.read()) == 10
+
+    def test_signal(self):
+        self.sim.set_signal(2, Replay(range(100, 150)))
+        stream = self.daq.create_stream(ExpMode.ANALOG_IN, 1, npoints=40,
+                                        dtype=np.int16)
+        stream.analog_setup(pinput=2, gain=0)
+        self.daq.start()
+        self.wait_stopped()
+        assert stream.read(raw=True).tolist() == list(range(100, 140))
+
+    def test_faults(self):
+        self.sim.faults = FaultInjector(bit_flip=0.002, spurious=0.002,
+                                        seed=1)
+        stream = self.daq.create_stream(ExpMode.ANALOG_IN, 1, continuous=True,
+                                        buffersize=10000)
+        stream.analog_setup(pinput=1, gain=0)
+        self.daq.start()
+        time.sleep(0.5)
+        self.daq.stop()
+
+        # corrupted packets are discarded without stopping the acquisition
+        stats = self.daq.stream_stats()
+        assert stats['bad_packets'] > 0
+        assert stats['packets'] > 10
+        assert len(stream.read()) > 200
+
+    def test_start_batch(self):
+        writes = []
+        write = self.sim.write
+        self.sim.write = lambda data: writes.append(data) or write(data)
+
+        for ch in range(2):
+            stream = self.daq.create_stream(ExpMode.ANALOG_IN, 1, npoints=5)
+            stream.analog_setup(pinput=ch + 1, gain=0)
+        self.daq.start()
+        self.wait_stopped()
+        # setup commands in a single write, then STREAM_START
+        assert len(writes) == 2
+
+    def test_commands_while_streaming(self):
+        stream = self.daq.create_stream(ExpMode.ANALOG_IN, 1, continuous=True,
+                                        buffersize=10000)
+        stream.analog_setup(pinput=1, gain=0)
+        self.daq.start()
+
+        def toggle(pio):
+            for i in range(10):
+                self.daq.set_pio(pio, i % 2)
+                assert self.daq.read_pio(pio) == i % 2
+
+        threads = [Thread(target=toggle, args=(pio,)) for pio in (1, 2)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+
+        with self.daq.batch() as b:
+            index = b.send_command(mkcmd(CMD.ID_CONFIG, ''), 'BBI')
+        assert b.result(index)[2] == self.sim.dev_id
+
+        data = stream.read(min_points=20, timeout=5)
+        self.daq.stop()
+        assert len(data) >= 20
+        assert self.daq.stream_stats()['bad_packets'] == 0
+        # commands work as usual after the stream
+        assert self.daq.get_info()[2] == self.sim.dev_id
+
+    def test_back_to_back_commands(self):
+        stream = self.daq.create_stream(ExpMode.ANALOG_IN, 1, continuous=True,
+                                        buffersize=10000)
+        stream.analog_setup(pinput=1, gain=0)
+        self.daq.start()
+        errors = []
+
+        def run():
+            try:
+                for i in range(200):
+                    self.daq.read_pio(1)
+            except Exception as e:
+                errors.append(e)
+
+        threads = [Thread(target=run) for _ in range(2)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        self.daq.stop()
+        assert not errors
+
+    def test_commands_with_faults(self):
+        # damaged stream frames never take a command response with them
+        self.sim.faults = FaultInjector(bit_flip=0.002, drop=0.002,
+                                        spurious=0.002, truncate=0.01, seed=1)
+        stream = self.daq.create_stream(ExpMode.ANALOG_IN, 1, continuous=True,
+                                        buffersize=10000)
+        stream.analog_setup(pinput=1, gain=0)
+        self.daq.start()
+        errors = []
+
+        def toggle(pio):
+            try:
+                for i in range(200):
+                    self.daq.set_pio(pio, i % 2)
+                    if self.daq.read_pio(pio) != i % 2:
+                        errors.append(i)
+            except Exception as e:
+                errors.append(e)
+
+        threads = [Thread(target=toggle, args=(pio,)) for pio in (1, 2)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        self.daq.stop()
+        assert not errors
+        assert self.daq.stream_stats()['bad_packets'] > 0
@@ -0,0 +1,274 @@
+import time
+import unittest
+import threading
+import numpy as np
+from opendaq.experiment import DAQStream, DAQExternal, ExpMode, Overflow
+
+
+class TestDAQStream(unittest.TestCase):
+    def setUp(self):
+        self.exp = DAQStream(ExpMode.ANALOG_IN, 1, 10, buffersize=100)
+        self.exp._set_running(True)
+
+    def feed(self, npoints, delay=0.05):
+        def run():
+            time.sleep(delay)
+            self.exp.add_points(np.arange(npoints))
+
+        thread = threading.Thread(target=run)
+        thread.start()
+        return thread
+
+    def test_read(self):
+        self.exp.add_points([1., 2., 3.])
+        data = self.exp.read()
+        assert isinstance(data, np.ndarray)
+        assert data.tolist() == [1., 2., 3.]
+
+    def test_read_min_points(self):
+        thread = self.feed(10)
+        data = self.exp.read(min_points=10, timeout=5)
+        thread.join()
+        assert len(data) == 10
+
+    def test_read_timeout(self):
+        self.exp.add_points([1.])
+        t0 = time.time()
+        data = self.exp.read(min_points=5, timeout=0.05)
+        assert time.time() - t0 >= 0.05
+        assert data.tolist() == [1.]
+
+    def test_wait_for(self):
+        thread = self.feed(20)
+        assert self.exp.wait_for(20, timeout=5)
+        thread.join()
+        assert not self.exp.wait_for(30, timeout=0.01)
+        self.assertRaises(ValueError, self.exp.wait_for, 101)
+
+    def test_finished(self):
+        def run():
+            time.sleep(0.05)
+            self.exp._set_running(False)
+
+        thread = threading.Thread(target=run)
+        thread.start()
+        assert not self.exp.wait_for(10)
+        thread.join()
+
+    def test_read_before_start(self):
+        exp = DAQStream(ExpMode.ANALOG_IN, 1, 10, buffersize=100)
+        t0 = time.time()
+        assert not exp.read(min_points=5, timeout=0.05).size
+        assert time.time() - t0 >= 0.05
+        # without a timeout, it does not wait for the start
+        assert not exp.wait_for(5)
+        assert not exp.read(min_points=5).size
+
+        def run():
+            time.sleep(0.05)
+            exp._set_running(True)
+            exp.add_points(np.arange(10))
+
+        thread = threading.Thread(target=run)
+        thread.start()
+        data = exp.read(min_points=10, timeout=5)
+        thread.join()
+        assert len(data) == 10
+
+
+class TestOverflow(unittest.TestCase):
+    def create(self, overflow):
+        exp = DAQStream(ExpMode.ANALOG_IN, 1, 10, buffersize=5,
+                        overflow=overflow)
+        exp._set_running(True)
+        return exp
+
+    def test_drop_oldest(self):
+        exp = self.create(Overflow.DROP_OLDEST)
+        exp.add_points(np.arange(8))
+        assert exp.read().tolist() == [3, 4, 5, 6, 7]
+        stats = exp.stats()
+        assert stats['received'] == 8
+        assert stats['delivered'] == 5
+        assert stats['dropped'] == 3
+
+    def test_drop_newest(self):
+        exp = self.create(Overflow.DROP_NEWEST)
+        exp.add_points(np.arange(3))
+        exp.add_points(np.arange(3, 8))
+        assert exp.read().tolist() == [0, 1, 2, 3, 4]
+        assert exp.stats()['dropped'] == 3
+
+    def test_spill(self):
+        exp = self.create(Overflow.SPILL)
+        exp.add_points(np.arange(8))
+        exp.add_points(np.arange(8, 12))
+        assert exp.stats()['spilled'] == 7
+        out = np.zeros(6)
+        assert exp.read_into(out) == 6
+        assert out.tolist() == [0, 1, 2, 3, 4, 5]
+        exp.add_points([12])
+        assert exp.read().tolist() == [6, 7, 8, 9, 10, 11, 12]
+        stats = exp.stats()
+        assert stats['dropped'] == 0
+        assert stats['delivered'] == stats['received'] == 13
+        assert stats['buffered'] == 0
+
+    def test_block(self):
+        exp = self.create(Overflow.BLOCK)
+        thread = threading.Thread(target=exp.add_points,
+                                  args=(np.arange(12),))
+        thread.start()
+        data = []
+        while len(data) < 12:
+            data.extend(exp.read(min_points=1, timeout=5).tolist())
+        thread.join()
+        assert data == list(range(12))
+        assert exp.stats()['dropped'] == 0
+
+    def test_block_finished(self):
+        exp = self.create(Overflow.BLOCK)
+        exp._set_running(False)
+        exp.add_points(np.arange(8))
+        assert exp.stats()['dropped'] == 3
+
+    def test_invalid(self):
+        self.assertRaises(ValueError, DAQStream, ExpMode.ANALOG_IN, 1, 10,
+                          overflow=2)
+
+
+class TestSubscription(unittest.TestCase):
+    def setUp(self):
+        self.exp = DAQStream(ExpMode.ANALOG_IN, 2, 10, buffersize=5)
+        self.exp.analog_setup(pinput=3)
+        self.batches = []
+
+    def callback(self, data, info):
+        self.batches.append((data.tolist(), info))
+
+    def test_batch_size(self):
+        sub = self.exp.subscribe(self.callback, batch_size=4,
+                                 max_latency_ms=10000)
+        self.exp.add_points(np.arange(3))
+        time.sleep(0.05)
+        assert self.batches == []
+        self.exp.add_points(np.arange(3, 6))
+        self.exp.unsubscribe(sub)
+        assert self.batches[0][0] == [0, 1, 2, 3, 4, 5]
+        info = self.batches[0][1]
+        assert info.number == 2
+        assert info.pinput == 3
+        assert info.index == 0
+        assert sub.delivered == 6
+
+    def test_latency(self):
+        sub = self.exp.subscribe(self.callback, batch_size=100,
+                                 max_latency_ms=20)
+        self.exp.add_points([1, 2])
+        time.sleep(0.2)
+        self.exp.add_points([3])
+        time.sleep(0.2)
+        assert [b[0] for b in self.batches] == [[1, 2], [3]]
+        assert self.batches[1][1].index == 2
+        self.exp.unsubscribe(sub)
+        assert self.exp.subscriptions == []
+
+    def test_slow_subscriber(self):
+        def slow(data, info):
+            time.sleep(0.1)
+            self.callback(data, info)
+
+        sub = self.exp.subscribe(slow, max_pending=10)
+        t0 = time.time()
+        for i in range(20):
+            self.exp.add_points(np.arange(i*5, i*5 + 5))
+        assert time.time() - t0 < 0.1
+        self.exp.unsubscribe(sub)
+        assert sub.dropped > 0
+        assert sub.delivered + sub.dropped == 100
+        assert self.batches[-1][0][-1] == 99
+
+
+class TestTimebase(unittest.TestCase):
+    def test_stream(self):
+        exp = DAQStream(ExpMode.ANALOG_IN, 1, 10, buffersize=100)
+        exp._set_running(True)
+        exp.add_points(np.arange(5))
+        exp.add_points(np.arange(5, 8))
+        t, data = exp.read(with_time=True)
+        assert len(t) == len(data) == 8
+        assert np.allclose(np.diff(t), 0.01)
+
+        exp.add_points(np.arange(8, 10))
+        times = np.zeros(10)
+        out = np.zeros(10)
+        assert exp.read_into(out, times) == 2
+        assert np.allclose(times[:2] - t[0], [0.08, 0.09])
+
+    def test_drop_oldest(self):
+        exp = DAQStream(ExpMode.ANALOG_IN, 1, 1, buffersize=4)
+        exp._set_running(True)
+        exp.add_points(np.arange(3))
+        exp.add_points(np.arange(3, 6))
+        t, data = exp.read(with_time=True)
+        assert data.tolist() == [2, 3, 4, 5]
+        assert np.allclose(np.diff(t), 0.001)
+
+    def test_external(self):
+        exp = DAQExternal(ExpMode.ANALOG_IN, 1, buffersize=100)
+        exp._set_running(True)
+        exp.add_points(np.arange(2))
+        time.sleep(0.02)
+        exp.add_points(np.arange(2, 4))
+        t, data = exp.read(with_time=True)
+        assert t[0] == t[1] < t[2] < t[3]
+
+    def test_spill(self):
+        exp = DAQExternal(ExpMode.ANALOG_IN, 1, buffersize=2,
+                          overflow=Overflow.SPILL)
+        exp._set_running(True)
+        arrivals = []
+        for i in range(5):
+            exp.add_points([i])
+            arrivals.append(time.time())
+            time.sleep(0.01)
+        t, data = exp.read(with_time=True)
+        assert data.tolist() == [0, 1, 2, 3, 4]
+        # the spilled points keep the arrival times of their packets
+        assert np.allclose(np.diff(t), np.diff(arrivals), atol=0.002)
+
+
+class TestRawStorage(unittest.TestCase):
+    def setUp(self):
+        self.exp = DAQStream(ExpMode.ANALOG_IN, 1, 10, buffersize=100,
+                             dtype=np.int16)
+        self.exp._set_converter(lambda raw: raw*0.5)
+
+    def test_read(self):
+        self.exp.add_points(np.array([2, -4, 6], dtype='>i2'))
+        assert self.exp.ring_buffer.dtype == np.int16
+        assert self.exp.read().tolist() == [1, -2, 3]
+        self.exp.add_points([8])
+        raw = self.exp.read(raw=True)
+        assert raw.dtype == np.int16
+        assert raw.tolist() == [8]
+
+    def test_read_into(self):
+        self.exp.add_points([2, 4, 6])
+        out = np.zeros(2)
+        assert self.exp.read_into(out) == 2
+        assert out.tolist() == [1, 2]
+        raw = np.zeros(2, dtype=np.int16)
+        assert self.exp.read_into(raw) == 1
+        assert raw[0] == 6
+
+    def test_read_into_repeated(self):
+        # destinations of different sizes, in int16 and float arrays
+        for size in (2, 5, 3, 5):
+            self.exp.add_points(np.arange(size)*2)
+            out = np.zeros(size)
+            assert self.exp.read_into(out) == size
+            assert out.tolist() == list(range(size))
+            self.exp.add_points([4])
+            raw = np.zeros(1, dtype=np.int16)
+            assert self.exp.read_into(raw) == 1 and raw[0] == 4
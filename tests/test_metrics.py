@@ -0,0 +1,23 @@
+import unittest
+from opendaq.common import mkcmd, CRCError, LengthError, NAK
+from opendaq.metrics import ProtocolMetrics
+
+
+class TestProtocolMetrics(unittest.TestCase):
+    def test_errors(self):
+        metrics = ProtocolMetrics()
+        response = mkcmd(3, 'BB', 1, 1)
+        metrics.record(3, 0.001, 5, response)
+        metrics.record(3, 0.001, 5, NAK, IOError("NAK response received"))
+        metrics.record(3, 0.001, 5, response, CRCError())
+        metrics.record(3, 0.001, 5, response[:4], LengthError())
+        metrics.record(3, 0.001, 5, response, ValueError())
+        metrics.record(3, 1., 5, b'', LengthError())
+        metrics.record_stream(100)
+
+        stats = metrics.to_dict()
+        assert stats['calls'] == 6 and stats['stream_bytes'] == 100
+        for key in ('naks', 'crc_errors', 'length_errors', 'other_errors',
+                    'timeouts'):
+            assert stats[key] == 1
+        assert stats['commands'][3]['histogram'][-4] == 1
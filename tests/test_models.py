@@ -1,4 +1,5 @@
 import unittest
+import numpy as np
 from opendaq.models import DAQModel, Gains, ModelM
 from opendaq.daq_model import CalibReg
 
@@ -39,6 +40,13 @@ class TestModelM(unittest.TestCase):
         assert m.raw_to_volts(32768, 1, 1, 0) == 4.096
         assert m.raw_to_volts(-32768, 1, 1, 0) == -4.096
 
+    def test_raw_to_volts_array(self):
+        m = ModelM(140, 123)
+        raw = np.array([0, 8000, 32767, -32768], dtype='>i2')
+        volts = m.raw_to_volts(raw, 1, 1, 0)
+        assert isinstance(volts, np.ndarray)
+        assert list(volts) == m.raw_to_volts(raw.tolist(), 1, 1, 0)
+
     def test_adc_calib(self):
         m = ModelM(140, 123)
 
@@ -52,6 +60,43 @@ class TestModelM(unittest.TestCase):
 
         assert abs(m.raw_to_volts(8000, 1, 1, 0) - out) < 1e-4
 
+    def test_adc_coefs(self):
+        m = ModelM(140, 123)
+        scale, offset = m.get_adc_coefs(1, 1, 0)
+        assert offset == 0
+        assert abs(scale - 4.096/32768) < 1e-12
+        assert m.get_adc_coefs(1, 1, 0) is m.get_adc_coefs(1, 1, 0)
+
+        regs = [CalibReg(1., 0.)]*len(m.adc_calib)
+        regs[0] = CalibReg(2., 0.)
+        written = []
+        assert m.write_adc_calib(regs, written.extend) == [1]
+        assert written == [(1, 2**16, 0)]
+        assert abs(m.get_adc_coefs(1, 1, 0)[0] - scale/2) < 1e-12
+        # unchanged registers are not written again
+        assert m.write_adc_calib(regs, written.extend) == []
+
+        m.load_adc_calib(lambda slots: [(0, 64)]*len(slots))
+        assert m.get_adc_coefs(1, 1, 0) == (scale, 4.)
+
+    def test_adc_coefs_slices(self):
+        m = ModelM(140, 123)
+        scale = m.get_adc_coefs(1, 1, 0)[0]
+        m.adc_calib[0:1] = [CalibReg(2., 0.)]
+        assert abs(m.get_adc_coefs(1, 1, 0)[0] - scale/2) < 1e-12
+
+        regs = m.adc_calib
+        regs.append(CalibReg(1., 0.))
+        regs.extend([CalibReg(1., 0.)])
+        regs += [CalibReg(1., 0.)]
+        regs.insert(0, CalibReg(1., 0.))
+        del regs[0]
+        regs.pop()
+        assert m.adc_calib is regs
+        assert abs(m.get_adc_coefs(1, 1, 0)[0] - scale/2) < 1e-12
+        del regs[0]
+        assert abs(m.get_adc_coefs(1, 1, 0)[0] - scale) < 1e-12
+
     def test_dac_calib(self):
         m = ModelM(140, 123)
 
@@ -66,3 +111,17 @@ class TestModelM(unittest.TestCase):
 
         self.assertRaises(ValueError, m.volts_to_raw, 5, 0)
         self.assertRaises(IndexError, m.volts_to_raw, 0, 1)
+
+    def test_volts_to_raw_array(self):
+        m = ModelM(140, 123)
+        m.dac_calib[0] = CalibReg(1.0, -0.1)
+        volts = np.linspace(-4, 4, 101)
+        raw = m.volts_to_raw(volts, 0)
+        assert raw.dtype == np.int16
+        assert raw.tolist() == [m.volts_to_raw(v, 0) for v in volts.tolist()]
+        assert m.volts_to_raw([4.096], 0)[0] == 32767
+
+        with self.assertRaises(ValueError) as cm:
+            m.volts_to_raw(np.array([0, 5, 1, -5, np.nan]), 0)
+        assert '[1, 3, 4]' in str(cm.exception)
+        self.assertRaises(IndexError, m.volts_to_raw, [0], 1)
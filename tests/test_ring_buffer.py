@@ -0,0 +1,43 @@
+import unittest
+import numpy as np
+from opendaq.ring_buffer import RingBuffer
+
+
+class TestRingBuffer(unittest.TestCase):
+    def test_write_read(self):
+        buf = RingBuffer(10)
+        assert buf.write([1, 2, 3]) == 0
+        assert len(buf) == 3
+        assert buf.read().tolist() == [1, 2, 3]
+        assert len(buf) == 0
+        assert buf.read().tolist() == []
+
+    def test_wraparound(self):
+        buf = RingBuffer(5, np.int16)
+        buf.write([1, 2, 3])
+        assert buf.read(2).tolist() == [1, 2]
+        assert buf.write([4, 5, 6, 7]) == 0
+        assert buf.write([8, 9]) == 2
+        out = buf.read()
+        assert out.dtype == np.int16
+        assert out.tolist() == [5, 6, 7, 8, 9]
+
+    def test_overflow(self):
+        buf = RingBuffer(4, np.float32)
+        buf.write([1])
+        assert buf.write(np.arange(10)) == 7
+        assert buf.read().tolist() == [6, 7, 8, 9]
+
+    def test_read_into(self):
+        buf = RingBuffer(4)
+        buf.write([1, 2, 3])
+        buf.read(2)
+        buf.write([4, 5, 6])
+        out = np.zeros(3)
+        assert buf.read_into(out) == 3
+        assert out.tolist() == [3, 4, 5]
+        assert buf.read_into(out) == 1
+        assert out[0] == 6
+
+    def test_invalid(self):
+        self.assertRaises(ValueError, RingBuffer, 0)
@@ -0,0 +1,48 @@
+import unittest
+import numpy as np
+from opendaq.signals import Sine, Square, Ramp, Noise, Replay
+
+
+class TestSignals(unittest.TestCase):
+    def setUp(self):
+        self.t = np.arange(8)/8.
+
+    def test_sine(self):
+        data = Sine(1000, freq=1., offset=10).samples(self.t)
+        assert data.dtype == np.int16
+        assert data.tolist() == [10, 717, 1010, 717, 10, -697, -990, -697]
+
+    def test_square(self):
+        data = Square(100, freq=2., duty=0.5).samples(self.t)
+        assert data.tolist() == [100, 100, -100, -100]*2
+        self.assertRaises(ValueError, Square, duty=2)
+
+    def test_ramp(self):
+        data = Ramp(800, freq=1.).samples(self.t)
+        assert data.tolist() == [-800, -600, -400, -200, 0, 200, 400, 600]
+
+    def test_clip(self):
+        data = Sine(50000, freq=1.).samples(self.t)
+        assert data.max() == 2**15 - 1
+        assert data.min() == -2**15
+
+    def test_noise(self):
+        t = np.arange(1000)
+        data = Noise(100, seed=3).samples(t)
+        assert abs(data.mean()) < 20
+        assert 80 < data.std() < 120
+
+        # same seed, same samples, whatever the block size
+        noise = Noise(100, seed=3)
+        blocks = [noise.samples(t[:1]), noise.samples(t[1:500]),
+                  noise.samples(t[500:])]
+        assert np.array_equal(np.concatenate(blocks), data)
+
+    def test_replay(self):
+        signal = Replay([1, 2, 3])
+        assert signal.samples(range(4)).tolist() == [1, 2, 3, 1]
+        assert signal.samples(range(2)).tolist() == [2, 3]
+
+        signal = Replay([1, 2, 3], loop=False)
+        assert signal.samples(range(5)).tolist() == [1, 2, 3, 3, 3]
+        self.assertRaises(ValueError, Replay, [])
@@ -0,0 +1,33 @@
+import os
+import sys
+import unittest
+import subprocess
+from opendaq import DAQ, ExpMode
+
+
+@unittest.skipUnless(hasattr(os, 'openpty'), 'Pseudo-terminals not available')
+class TestSimServer(unittest.TestCase):
+    def setUp(self):
+        self.server = subprocess.Popen(
+            [sys.executable, '-m', 'opendaq.sim_server'],
+            stdout=subprocess.PIPE)
+        port = self.server.stdout.readline().decode().strip()
+        self.daq = DAQ(port)
+
+    def tearDown(self):
+        self.daq.close()
+        self.server.terminate()
+        self.server.wait()
+        self.server.stdout.close()
+
+    def test_server(self):
+        assert self.daq.get_info() == (2, 131, 456423)
+        self.daq.set_pio(1, 1)
+        assert self.daq.read_pio(1) == 1
+
+        stream = self.daq.create_stream(ExpMode.ANALOG_IN, 1, npoints=100)
+        stream.analog_setup(pinput=1, gain=0)
+        self.daq.start()
+        data = stream.read(min_points=100, timeout=5)
+        self.daq.stop()
+        assert len(data) == 100
@@ -0,0 +1,181 @@
+import time
+import unittest
+import numpy as np
+from opendaq.common import mkcmd, mkstream
+from opendaq.faults import FaultInjector
+from opendaq.simulator import DAQSimulator
+from opendaq.signals import Sine, Replay
+
+
+class TestSerialSim(unittest.TestCase):
+    def setUp(self):
+        self.sim = DAQSimulator()
+
+    def test_commands(self):
+        # same command number, different payload lengths
+        self.sim.write(mkcmd(3, 'BB', 2, 1))
+        assert self.sim.read(6) == mkcmd(3, 'BB', 2, 1)
+        self.sim.write(mkcmd(3, 'B', 2))
+        assert self.sim.read(6) == mkcmd(3, 'BB', 2, 1)
+
+    def test_invalid_command(self):
+        self.sim.write(mkcmd(3, 'BBB', 1, 1, 1))
+        assert self.sim.read(4) == self.sim.NACK
+        self.sim.write(mkcmd(99, ''))
+        assert self.sim.read(4) == self.sim.NACK
+
+    def test_read(self):
+        for i in range(100):
+            self.sim.write(mkcmd(39, ''))
+        response = mkcmd(39, 'BBI', self.sim.hw_ver, self.sim.fw_ver,
+                         self.sim.dev_id)
+        assert self.sim.in_waiting == 100*len(response)
+        assert self.sim.read(3) == response[:3]
+        assert self.sim.read(len(response) - 3) == response[3:]
+        data = self.sim.read(1000*len(response))
+        assert data == 99*response
+        assert self.sim.read(1) == b''
+
+    def test_deterministic_stream(self):
+        frames = []
+        for i in range(2):
+            sim = DAQSimulator()
+            sim.set_signal(1, Sine(freq=7.))
+            time.sleep(0.01*i)
+            for cmd in (mkcmd(19, 'BH', 1, 1), mkcmd(32, 'BHb', 1, 5, 1),
+                        mkcmd(22, 'BBBBBB', 1, 0, 1, 0, 0, 1)):
+                sim.write(cmd)
+            sim.read(sim.in_waiting)
+            time.sleep(0.01*i)
+            sim.write(mkcmd(64, ''))
+            sim.read(4)
+            time.sleep(0.02)
+            frames.append(sim.read(sim.in_waiting))
+
+        # the first sample of a sine without phase is 0
+        stream = mkstream(25, 'BBBB5h', 1, 1, 0, 0,
+                          *Sine(freq=7.).samples(0.001*np.arange(5)))
+        assert frames[0] == frames[1]
+        assert frames[0].startswith(bytes(stream))
+
+    def test_shared_input(self):
+        # two channels on the same input get the same samples
+        self.sim.set_signal(1, Replay(range(10)))
+        for ch in (1, 2):
+            for cmd in (mkcmd(19, 'BH', ch, 1), mkcmd(32, 'BHb', ch, 5, 1),
+                        mkcmd(22, 'BBBBBB', ch, 0, 1, 0, 0, 1)):
+                self.sim.write(cmd)
+        self.sim.write(mkcmd(64, ''))
+        self.sim.read(self.sim.in_waiting)
+        time.sleep(0.02)
+
+        data = self.sim.read(self.sim.in_waiting)
+        for ch in (1, 2):
+            stream = mkstream(25, 'BBBB5h', ch, 1, 0, 0, *range(5))
+            assert bytes(stream) in data
+
+
+class TestWireEmulation(unittest.TestCase):
+    def response(self, sim):
+        return mkcmd(39, 'BBI', sim.hw_ver, sim.fw_ver, sim.dev_id)
+
+    def test_byte_rate(self):
+        sim = DAQSimulator(timeout=2, byte_rate=10000)
+        for i in range(100):
+            sim.write(mkcmd(39, ''))
+        size = 100*len(self.response(sim))
+
+        t0 = time.time()
+        assert sim.in_waiting < size
+        data = sim.read(size)
+        elapsed = time.time() - t0
+        assert len(data) == size
+        assert 0.08 < elapsed < 0.5
+
+    def test_cmd_latency(self):
+        sim = DAQSimulator(timeout=2, cmd_latency=0.05)
+        t0 = time.time()
+        sim.write(mkcmd(39, ''))
+        assert sim.in_waiting == 0
+        assert sim.read(10) == self.response(sim)
+        assert time.time() - t0 >= 0.05
+
+    def test_latency_timer(self):
+        sim = DAQSimulator(timeout=2, latency_timer=0.02)
+        sim.write(mkcmd(39, ''))
+        assert sim.read(10) == self.response(sim)
+
+        # responses are delivered at the ticks of the timer, so every round
+        # trip after the first one takes a whole period
+        t0 = time.time()
+        for i in range(5):
+            sim.write(mkcmd(39, ''))
+            assert sim.read(10) == self.response(sim)
+        assert 0.09 <= time.time() - t0 < 1
+
+    def test_timeout(self):
+        sim = DAQSimulator(timeout=0.1, byte_rate=10000)
+        sim.write(mkcmd(39, ''))
+        t0 = time.time()
+        assert sim.read(100) == self.response(sim)
+        assert time.time() - t0 >= 0.1
+
+
+class TestFaultInjection(unittest.TestCase):
+    def setUp(self):
+        self.frame = mkstream(25, 'BBBB20h', 1, 1, 0, 0, *range(20))
+
+    def test_no_faults(self):
+        faults = FaultInjector(seed=1)
+        assert faults.corrupt(self.frame) == self.frame
+        assert faults.stats()['frames'] == 1
+
+    def test_bit_flip(self):
+        faults = FaultInjector(bit_flip=1., seed=1)
+        data = faults.corrupt(self.frame)
+        assert len(data) == len(self.frame)
+        assert all(bin(a ^ b).count('1') == 1
+                   for a, b in zip(bytearray(data), bytearray(self.frame)))
+        assert faults.stats()['bit_flips'] == len(self.frame)
+
+    def test_drop(self):
+        faults = FaultInjector(drop=0.5, seed=1)
+        data = faults.corrupt(self.frame)
+        assert len(data) + faults.stats()['dropped'] == len(self.frame)
+        assert 0 < len(data) < len(self.frame)
+
+    def test_spurious(self):
+        faults = FaultInjector(spurious=0.2, seed=1)
+        data = faults.corrupt(self.frame)
+        nspurious = faults.stats()['spurious']
+        assert nspurious > 0
+        assert len(data) == len(self.frame) + nspurious
+        assert data.count(b'\x7e') == self.frame.count(b'\x7e') + nspurious
+
+    def test_truncate(self):
+        faults = FaultInjector(truncate=1., seed=1)
+        data = faults.corrupt(self.frame)
+        assert self.frame.startswith(data) and len(data) < len(self.frame)
+        assert faults.stats()['truncated'] == 1
+
+    def test_seed(self):
+        frames = [FaultInjector(bit_flip=0.1, drop=0.1, seed=5).corrupt(
+            self.frame) for i in range(2)]
+        assert frames[0] == frames[1]
+
+    def test_delayed_stop(self):
+        faults = FaultInjector(delay_stop=1., stop_delay=0.2, seed=1)
+        sim = DAQSimulator(timeout=1, faults=faults)
+        for cmd in (mkcmd(19, 'BH', 1, 1), mkcmd(32, 'BHb', 1, 5, 1),
+                    mkcmd(22, 'BBBBBB', 1, 0, 1, 0, 0, 1), mkcmd(64, '')):
+            sim.write(cmd)
+        sim.read(sim.in_waiting)
+
+        stop = mkstream(80, 'B', 1)
+        t0 = time.time()
+        data = b''
+        while not data.endswith(stop) and time.time() - t0 < 2:
+            data += sim.read(1)
+        assert data.endswith(stop)
+        assert time.time() - t0 >= 0.2
+        assert faults.stats()['delayed_stops'] == 1
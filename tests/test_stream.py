@@ -0,0 +1,114 @@
+import unittest
+from opendaq.common import mkcmd, mkstream
+from opendaq.stream import StreamDecoder, PendingResponses
+
+
+class TestStreamDecoder(unittest.TestCase):
+    def setUp(self):
+        self.decoder = StreamDecoder()
+        self.packets = [
+            mkstream(25, 'BBBB3h', 1, 8, 0, 0, 100, -200, 0x7e7d),
+            mkstream(25, 'BBBB2h', 2, 7, 0, 0, 0x7d, 5),
+            mkstream(80, 'B', 1),
+        ]
+
+    def test_single_chunk(self):
+        packets = self.decoder.feed(b''.join(self.packets))
+        assert len(packets) == 3
+        assert packets[0] == mkcmd(25, 'BBBB3h', 1, 8, 0, 0, 100, -200, 0x7e7d)
+        assert packets[1] == mkcmd(25, 'BBBB2h', 2, 7, 0, 0, 0x7d, 5)
+        assert packets[2] == mkcmd(80, 'B', 1)
+
+    def test_partial_packets(self):
+        data = b''.join(self.packets)
+        packets = []
+        for i in range(len(data)):
+            packets.extend(self.decoder.feed(data[i:i + 1]))
+        assert packets == [p for p in self.decoder.feed(data)]
+
+    def test_junk(self):
+        data = b'\x01\x02' + self.packets[0] + b'\xff' + self.packets[2]
+        packets = self.decoder.feed(data)
+        assert len(packets) == 2
+        assert packets[1] == mkcmd(80, 'B', 1)
+
+    def test_truncated_packet(self):
+        data = self.packets[0][:6] + self.packets[1]
+        packets = self.decoder.feed(data)
+        assert packets == [mkcmd(25, 'BBBB2h', 2, 7, 0, 0, 0x7d, 5)]
+
+    def test_bad_crc(self):
+        bad = bytearray(self.packets[0])
+        bad[9] ^= 0x01
+        data = bytes(bad) + self.packets[1] + self.packets[2]
+        packets = self.decoder.feed(data)
+        assert packets == [mkcmd(25, 'BBBB2h', 2, 7, 0, 0, 0x7d, 5),
+                           mkcmd(80, 'B', 1)]
+        assert self.decoder.stats()['bad_packets'] == 1
+
+    def test_resync(self):
+        # spurious start byte in the middle of the first packet
+        data = (self.packets[0][:5] + b'\x7e' + self.packets[0][5:] +
+                self.packets[1])
+        packets = self.decoder.feed(data)
+        assert packets == [mkcmd(25, 'BBBB2h', 2, 7, 0, 0, 0x7d, 5)]
+        assert self.decoder.stats()['bad_packets'] == 2
+
+        packets = self.decoder.feed(b'\x01\x02' + self.packets[2])
+        assert packets == [mkcmd(80, 'B', 1)]
+        stats = self.decoder.stats()
+        assert stats['resyncs'] == 1 and stats['skipped_bytes'] == 2
+        assert stats['packets'] == 2
+
+    def test_commands(self):
+        decoder = StreamDecoder(commands=(80,))
+        assert decoder.feed(b''.join(self.packets)) == [mkcmd(80, 'B', 1)]
+        assert decoder.stats()['bad_packets'] == 2
+        decoder.reject()
+        assert decoder.stats()['bad_packets'] == 3
+        assert decoder.stats()['packets'] == 0
+
+    def test_responses(self):
+        response = mkcmd(39, 'BBI', 1, 2, 3)
+        nak = mkcmd(160, '')
+        pending = PendingResponses([len(response)] * 2, [39] * 2)
+        self.decoder.pending = pending
+        data = self.packets[0] + response + self.packets[1] + nak + \
+            self.packets[2]
+        packets = []
+        for i in range(0, len(data), 5):
+            packets.extend(self.decoder.feed(data[i:i + 5]))
+        assert len(packets) == 3
+        assert pending.wait(0)
+        assert pending.responses == [response, nak]
+        assert self.decoder.stats()['resyncs'] == 0
+
+    def test_response_after_bad_packet(self):
+        response = mkcmd(39, 'BBI', 1, 2, 3)
+        pending = PendingResponses([len(response)], [39])
+        self.decoder.pending = pending
+        data = self.packets[0][:-1] + response + self.packets[1]
+        packets = []
+        for i in range(len(data)):
+            packets.extend(self.decoder.feed(data[i:i + 1]))
+        assert pending.responses == [response]
+        assert packets == [mkcmd(25, 'BBBB2h', 2, 7, 0, 0, 0x7d, 5)]
+        assert self.decoder.stats()['bad_packets'] == 1
+
+    def test_responses_back_to_back(self):
+        # another thread sends its command as soon as a response is complete
+        decoder = self.decoder
+        response = mkcmd(39, 'BBI', 1, 2, 3)
+        second = PendingResponses([len(response)], [39])
+
+        class First(PendingResponses):
+            def add(self, data):
+                PendingResponses.add(self, data)
+                decoder.pending = second
+
+        first = decoder.pending = First([len(response)], [39])
+        packets = decoder.feed(self.packets[0] + response + self.packets[1] +
+                               response)
+        assert len(packets) == 2
+        assert first.responses == second.responses == [response]
+        assert decoder.pending is second